@@ -0,0 +1,50 @@
+"""
+Measures the per-tick cost of updating a large number of mobiles
+
+Usage: python -m benchmarks.bench_mobiles [mobile count]
+"""
+import sys
+import time
+
+import numpy as np
+
+from sionnach.mobiles import DIRECTIONS, Mobiles
+
+ROOM_COUNT = 10000
+TICKS = 50
+
+
+def main(mobile_count):
+    rng = np.random.default_rng(0)
+
+    # Random world: each exit has a 50% chance of leading somewhere
+    exits = rng.integers(0, ROOM_COUNT, size=(ROOM_COUNT, len(DIRECTIONS)))
+    exits[rng.random(exits.shape) < 0.5] = -1
+
+    mobiles = Mobiles(exits, seed=0)
+    for i in range(mobile_count):
+        mobiles.spawn(
+            room=i % ROOM_COUNT,
+            hp=100,
+            regen=1,
+            move_interval=1 + i % 10,
+            aggressive=i % 4 == 0,
+        )
+    player_rooms = rng.integers(0, ROOM_COUNT, size=200)
+
+    event_count = 0
+    times = []
+    for _ in range(TICKS):
+        mobiles.damage(rng.integers(0, mobiles.count, size=1000), 5)
+        start = time.perf_counter()
+        event_count += len(mobiles.step(player_rooms))
+        times.append((time.perf_counter() - start) * 1000)
+
+    print(f"{mobile_count} mobiles, {TICKS} ticks")
+    print(f"  Mean tick:   {np.mean(times):8.2f}ms")
+    print(f"  Worst tick:  {np.max(times):8.2f}ms")
+    print(f"  Events/tick: {event_count / TICKS:8.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
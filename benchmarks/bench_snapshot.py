@@ -0,0 +1,72 @@
+"""
+Compares loading world state from a snapshot against loading it through the ORM
+
+Usage: python -m benchmarks.bench_snapshot [row count]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sionnach.db import Base, Help
+from sionnach.snapshot import load_tables, track_changes, write_snapshot
+
+
+def best_of(fn, repeat=5):
+    """
+    Returns the fastest of several timed runs of the given function (in ms)
+    :param fn:
+    :param repeat:
+    :return:
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(row_count):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Base.metadata.create_all(db_engine)
+        db_session = sessionmaker(bind=db_engine)()
+
+        db_session.bulk_insert_mappings(
+            Help,
+            [
+                {
+                    "name": f"HELP{i}",
+                    "keywords": f"help{i} topic{i}",
+                    "text": f"Help text for topic {i}. " * 20,
+                }
+                for i in range(row_count)
+            ],
+        )
+        db_session.commit()
+        track_changes(db_session, [Help.__table__])
+
+        snapshot_path = os.path.join(tmp_dir, "world.snapshot")
+        tables, _ = load_tables(db_session, [Help.__table__], snapshot_path)
+        write_snapshot(snapshot_path, tables)
+
+        def orm_load():
+            db_session.expunge_all()
+            return {help.name: help.text for help in db_session.query(Help).all()}
+
+        def snapshot_load():
+            return load_tables(db_session, [Help.__table__], snapshot_path)
+
+        print(f"{row_count} helpfile rows")
+        print(f"  ORM load:            {best_of(orm_load):8.1f}ms")
+        print(f"  Snapshot load:       {best_of(snapshot_load):8.1f}ms")
+        print(f"  Snapshot size:       {os.path.getsize(snapshot_path):8d} bytes")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
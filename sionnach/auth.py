@@ -1,23 +1,22 @@
 """
 Authentication management
 """
-import bcrypt
 from sqlalchemy.orm.exc import NoResultFound
 
 from sionnach import log
 from sionnach.character import Character
-from sionnach.db import Help, User
+from sionnach.db import User
 from sionnach.exceptions import AuthInvalidPassword
 from sionnach.server import Client
-from sionnach.util import get_helpfile
 
 logger = log.logger(__name__)
 
 
 class Auth:
-    def __init__(self, db_session, mark_authenticated):
+    def __init__(self, db_session, mark_authenticated, get_helpfile):
         self.db_session = db_session
         self.mark_authenticated = mark_authenticated
+        self.get_helpfile = get_helpfile
 
     async def authenticate_client(self, client: Client):
         """
@@ -27,7 +26,7 @@ class Auth:
         :return:
         """
         # Hello, client!
-        client.send(get_helpfile(self.db_session, "LOGIN"))
+        client.send(self.get_helpfile("LOGIN"))
         client.send_raw(f"Name: ")
 
         try:
@@ -38,7 +37,7 @@ class Auth:
 
         # At this point, the client has logged in successfully.
         character = Character(client=client, name=profile.name)
-        return self.mark_authenticated(character)
+        return await self.mark_authenticated(character)
 
     async def _login(self, client):
         """
@@ -62,6 +61,10 @@ class Auth:
             # Add a newline here, because password mode stops the client-side newline
             # echo
             client.send("")
+
+            # Imported on first use, since nothing else needs it
+            import bcrypt
+
             if not bcrypt.checkpw(password.encode(), profile.password):
                 client.send(f"Invalid password.")
                 raise AuthInvalidPassword
@@ -72,7 +75,7 @@ class Auth:
 
         # Authenticated.
         client.set_password_mode(False)
-        client.send(get_helpfile(self.db_session, "MOTD"))
+        client.send_paged(self.get_helpfile("MOTD"))
         return profile
 
     async def _new_user(self, client, name):
@@ -111,6 +114,8 @@ class Auth:
         client.set_password_mode(False)
 
         # Persist
+        import bcrypt
+
         new_user = User(
             name=name, password=bcrypt.hashpw(password.encode(), bcrypt.gensalt())
         )
@@ -3,6 +3,11 @@ Handles high-level communication and management of individual characters and the
 connections
 """
 from asyncio import QueueEmpty
+from collections import deque
+
+from sionnach import config
+from sionnach.db import Alias
+from sionnach.history import Aliases, History, expand_speedwalk
 
 
 class Character:
@@ -10,21 +15,50 @@ class Character:
         self.client = client
         self.name = name
 
+        # Input conveniences
+        self.history = History(config.history_size)
+        self.aliases = Aliases()
+
+        # Commands expanded from the last line of input, waiting to be processed
+        self.pending_commands = deque()
+
+        # Action journal, for persisting changes (set on init)
+        self.journal = None
+
     # =-=-=-=-=-=-=
     # Communication
     # =-=-=-=-=-=-=
 
     def get_input(self):
         """
-        Returns the next currently available line of input for the given
-        character (non-blocking)
+        Returns the next currently available command for the given character
+        (non-blocking).
+        Lines of input are expanded (history, aliases, speedwalks) into one or more
+        commands; these are returned one at a time before the next line of input is
+        read.
         :return:
         """
+        if self.pending_commands:
+            return self.pending_commands.popleft()
+
         try:
-            return self.client.input_queue.get_nowait()
+            line = self.client.receive_nowait()
         except QueueEmpty:
             return None
 
+        # An empty line while paging just continues to the next page; anything else
+        # abandons the rest of the paged output
+        if line == "":
+            if self.client.next_page():
+                return None
+        else:
+            self.client.discard_pages()
+
+        self.pending_commands.extend(self._expand_input(line))
+        if self.pending_commands:
+            return self.pending_commands.popleft()
+        return None
+
     def send(self, msg):
         """
         Sends a string to the given character
@@ -33,6 +67,15 @@ class Character:
         """
         return self.client.send(msg)
 
+    def send_paged(self, msg):
+        """
+        Sends a (potentially long) string to the given character, one screen at a
+        time
+        :param msg:
+        :return:
+        """
+        return self.client.send_paged(msg)
+
     async def async_close(self):
         """
         Gracefully logs the character out and closes its client connection
@@ -41,13 +84,147 @@ class Character:
         # TODO: Save, any other cleanup
         return await self.client.close()
 
+    def _expand_input(self, line):
+        """
+        Expands a single line of input into the list of commands it represents.
+        Expansion happens in one pass: history substitution, then aliases, then
+        command separators and speedwalks.  The result is capped at
+        `config.max_expanded_commands`.
+        :param line:
+        :return:
+        """
+        if line == "":
+            return [line]
+
+        if line.startswith(config.history_prefix):
+            previous = self.history.last(line[len(config.history_prefix) :])
+            if previous is None:
+                self.send("No matching command in history.")
+                return []
+            line = previous
+        self.history.add(line)
+
+        # Built-in input settings (aliases, colour) are handled here, before aliases
+        # are expanded
+        verb, _, args = line.partition(" ")
+        if verb == "alias":
+            self._alias_command(args)
+            return []
+        if verb == "unalias":
+            self._unalias_command(args)
+            return []
+        if verb == "colour":
+            self._colour_command(args)
+            return []
+
+        expanded = self.aliases.expand(line)
+        if expanded is None:
+            self.send(
+                f"That alias expands to more than {config.max_input_length} "
+                "characters."
+            )
+            return []
+        line = expanded
+
+        limit = config.max_expanded_commands
+        commands = []
+        for command in line.split(config.command_separator):
+            command = command.strip()
+            if not command:
+                continue
+
+            directions = None
+            if command.startswith(config.speedwalk_prefix):
+                directions = expand_speedwalk(
+                    command[len(config.speedwalk_prefix) :], limit + 1 - len(commands)
+                )
+
+            if directions is None:
+                commands.append(command)
+            else:
+                commands.extend(directions)
+
+            if len(commands) > limit:
+                self.send(f"Too many commands; only the first {limit} will be run.")
+                del commands[limit:]
+                break
+
+        return commands
+
+    def _alias_command(self, args):
+        """
+        "alias": Lists aliases, or defines one ("alias <name> <commands>")
+        :param args:
+        :return:
+        """
+        name, _, expansion = args.strip().partition(" ")
+        if not name:
+            if not len(self.aliases):
+                self.send("You have no aliases defined.")
+            for alias, alias_expansion in self.aliases:
+                self.send(f"{alias}: {alias_expansion}")
+            return
+
+        if not expansion:
+            self.send("Usage: alias <name> <commands>")
+            return
+
+        expansion = expansion.strip()
+        error = self.aliases.set(name, expansion)
+        if error:
+            self.send(error)
+            return
+
+        self.record("alias_set", name=name.lower(), expansion=expansion)
+        self.send(f"Alias '{name}' set.")
+
+    def _unalias_command(self, args):
+        """
+        "unalias": Removes an alias ("unalias <name>")
+        :param args:
+        :return:
+        """
+        name = args.strip()
+        if self.aliases.remove(name):
+            self.record("alias_remove", name=name.lower())
+            self.send(f"Alias '{name}' removed.")
+        else:
+            self.send(f"No alias named '{name}'.")
+
+    def _colour_command(self, args):
+        """
+        "colour": Shows or sets whether output is colourised ("colour [on|off]")
+        :param args:
+        :return:
+        """
+        setting = args.strip().lower()
+        if setting in ("on", "off"):
+            self.client.colour = setting == "on"
+        elif setting:
+            self.send("Usage: colour [on|off]")
+            return
+        self.send(f"Colour is {'{gon{x' if self.client.colour else 'off'}.")
+
     # =-=-=-=-=-=
     # Management
     # =-=-=-=-=-=
-    def init(self, db_session):
+    def init(self, db_session, journal):
         """
         Loads attributes from the DB.  Only this method and the .save() method should
-        be able to touch the DB
+        be able to touch the DB; other changes are persisted via the action journal.
+        :return:
+        """
+        self.journal = journal
+
+        for alias in db_session.query(Alias).filter(Alias.user == self.name.lower()):
+            self.aliases.set(alias.name, alias.expansion)
+
+    def record(self, action, **data):
+        """
+        Journals a persistent change made by this character
+        :param action:
+        :param data:
         :return:
         """
-        pass
+        if self.journal is not None:
+            self.journal.record(action, user=self.name.lower(), **data)
@@ -4,20 +4,90 @@ Config
 # Debug mode
 debug = True
 
-# Whether to enable the nested asyncio loop patch
-nest_asyncio = True
+# Whether to enable the nested asyncio loop patch (only needed when running inside
+# an existing event loop, e.g. from some IDEs/kernels)
+nest_asyncio = False
 
 # Database connection string (for SQLAlchemy)
 db_uri = "sqlite:///data/data.db"
 
+# World state snapshot file, for fast warm starts
+snapshot_path = "data/world.snapshot"
+
+# How often to check the DB for changes to the world state (in ticks)
+world_refresh_interval = 1
+
+# How often to snapshot the world state, if it has changed (in ticks)
+snapshot_interval = 720
+
+# Action journal file (committed every tick)
+journal_path = "data/actions.journal"
+
+# How often to fold the action journal into the DB (in ticks)
+journal_compact_interval = 60
+
+# Seed for world randomness (None for a fresh seed every run)
+random_seed = None
+
+# If set, client input is recorded to this file for offline replay (see
+# sionnach.simulation).  Passwords are masked.
+trace_path = None
+
 # Listen port for the server
 port = 4000
 
+# Clients that haven't logged in within this time of connecting are dropped, however
+# active they are (in s)
+login_timeout = 120
+
+# Logged-in clients that send no input for this long are dropped (in s)
+idle_timeout = 1800
+
+# Quiet clients are sent a telnet keepalive at this interval, so that dead
+# connections are noticed (in s; must be positive)
+keepalive_interval = 60
+
 # World tick interval (in s)
 tick_interval = 5
 
 # Maximum length of input to accept from clients
 max_input_length = 512
 
+# Maximum number of bytes to read from a client socket at once
+read_size = 4096
+
 # Message preview length when logging output to clients (in debug mode)
 output_preview_length = 80
+
+# Default terminal size for clients that don't negotiate one (via NAWS)
+default_width = 80
+default_height = 24
+
+# Prompt shown between pages of paged output
+more_prompt = "[Press Enter to continue] "
+
+# Whether clients receive ANSI colour codes by default
+ansi_colour = True
+
+# Number of distinct rendered texts (per terminal profile) to keep cached
+format_cache_size = 1024
+
+# Number of previous commands remembered per character
+history_size = 50
+
+# Prefix for repeating a previous command ("!" alone repeats the last command;
+# "!<text>" repeats the last command starting with <text>)
+history_prefix = "!"
+
+# Maximum number of aliases per character
+max_aliases = 100
+
+# Separates multiple commands entered on a single line (or in a single alias)
+command_separator = ";"
+
+# Prefix for speedwalk strings (e.g., ".3n2e")
+speedwalk_prefix = "."
+
+# Maximum number of commands a single line of input can expand into (via aliases,
+# separators and speedwalks)
+max_expanded_commands = 20
@@ -0,0 +1,337 @@
+"""
+The main loop controller
+- Initialises the DB, engine, authentication and server
+- Runs the main tick loop
+- Tracks clients from connection through to login
+
+To keep restarts short, the server starts accepting connections straight away.
+The heavy modules (SQLAlchemy, NumPy, etc.) are only imported afterwards, and the
+DB and engine are warmed up, all off the event loop; logins wait until warm-up is
+complete.
+"""
+import asyncio
+import importlib
+import time
+from contextlib import contextmanager, suppress
+
+from sionnach import config, exceptions, log
+from sionnach.server import Server
+
+logger = log.logger("sionnach.main")
+
+# Imported in the background during warm-up
+HEAVY_MODULES = ("sqlalchemy.orm", "sionnach.auth", "sionnach.engine")
+
+
+def _import_heavy_modules():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+
+def _open_db():
+    """
+    Connects to the DB, creating any missing tables
+    :return: SQLAlchemy ORM session
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from sionnach.db import Base
+
+    db_engine = create_engine(config.db_uri)
+    Base.metadata.create_all(db_engine)
+    return sessionmaker(bind=db_engine)()
+
+
+class Act:
+    def __init__(self):
+        logger.info("== Sionnach ==")
+
+        # SQLAlchemy ORM session
+        self.db_session = None
+
+        # Handles the low-level client/server interface
+        self.server = None
+
+        # Handles client authentication
+        self.auth = None
+
+        # Handles system logic
+        self.engine = None
+
+        # Holds client state for authentication
+        self.unauthed_clients = []
+        self.authed_chars = []
+
+        # Pending authentication tasks (client -> task)
+        self.auth_tasks = {}
+
+        # For calculating total uptime
+        self.start_time = None
+
+        # Set once warm-up is complete (or has failed); logins wait for this
+        self.ready = None
+        self.startup_failed = False
+
+        # (Startup phase, duration in ms)
+        self.startup_times = []
+
+    async def run(self):
+        """
+        Initialises the server and runs the main loop until a shutdown is
+        requested or an error occurs.
+        :return:
+        """
+        await self.start(listen=True)
+
+        logger.info("Systems online.")
+
+        self.start_time = asyncio.get_running_loop().time()
+
+        try:
+            await self.tick()
+        except exceptions.RestartInterrupt:
+            raise
+        except exceptions.ShutdownInterrupt:
+            raise
+
+    async def start(self, listen=False):
+        """
+        Initialises every system.
+        If `listen` is set, the server starts accepting connections before the
+        rest of the systems warm up; new clients are held at the login prompt until
+        warm-up is complete.
+        :param listen:
+        :return:
+        """
+        boot_start = time.perf_counter()
+        self.ready = asyncio.Event()
+
+        logger.info("Initialising server...")
+        self.server = Server(
+            register_client=self.register_client,
+            deregister_client=self.deregister_client,
+        )
+        if listen:
+            with self._startup_phase("listen"):
+                await self.server.start_server()
+
+        await self.warm_up()
+
+        logger.info(
+            f"Startup profile ({(time.perf_counter() - boot_start) * 1000:.1f}ms): "
+            + ", ".join(f"{phase} {ms:.1f}ms" for phase, ms in self.startup_times)
+        )
+
+    async def warm_up(self):
+        """
+        Loads the heavy modules, DB, world state and authentication, then releases
+        any clients waiting to log in.
+        Everything that blocks runs in a worker thread, so that connecting clients
+        are still served in the meantime.
+        If warm-up fails, waiting clients are told and dropped before the error is
+        raised.
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            with self._startup_phase("imports"):
+                await loop.run_in_executor(None, _import_heavy_modules)
+
+            from sionnach.auth import Auth
+            from sionnach.engine import Engine
+
+            logger.info("Initialising DB...")
+            with self._startup_phase("DB"):
+                self.db_session = await loop.run_in_executor(None, _open_db)
+
+            logger.info("Initialising engine...")
+            self.engine = Engine(self.db_session)
+            await loop.run_in_executor(None, self._load_engine)
+
+            logger.info("Initialising authentication...")
+            self.auth = Auth(
+                db_session=self.db_session,
+                mark_authenticated=self.mark_authenticated,
+                get_helpfile=self.engine.get_helpfile,
+            )
+        except Exception:
+            logger.exception("Warm-up failed.")
+            await self._abort_startup()
+            raise
+
+        self.ready.set()
+
+    def _load_engine(self):
+        """
+        Loads the world state and opens the action journal (in a worker thread)
+        :return:
+        """
+        with self._startup_phase("world"):
+            self.engine.load_world()
+        with self._startup_phase("journal"):
+            self.engine.open_journal()
+
+        # Release this thread's DB connection; the session is only used from the
+        # event loop from here on
+        self.db_session.close()
+
+    async def _abort_startup(self):
+        """
+        Stops accepting connections and drops every client waiting to log in
+        :return:
+        """
+        if self.server.server is not None:
+            self.server.server.close()
+
+        self.startup_failed = True
+        self.ready.set()
+
+        # Waiting logins see the failure and drop their clients
+        await asyncio.gather(*self.auth_tasks.values(), return_exceptions=True)
+
+    @contextmanager
+    def _startup_phase(self, phase):
+        """
+        Times a startup phase for the startup profile
+        :param phase:
+        :return:
+        """
+        start = time.perf_counter()
+        yield
+        self.startup_times.append((phase, (time.perf_counter() - start) * 1000))
+
+    async def tick(self):
+        """
+        Main loop.
+        :return:
+        """
+        while True:
+            # Try to mitigate tick time drift
+            tick_start = asyncio.get_running_loop().time()
+
+            logger.debug(
+                f"Main tick (up: "
+                f"{asyncio.get_running_loop().time() - self.start_time}s)"
+            )
+
+            # World updates
+            self.engine.tick()
+
+            # Connection housekeeping
+            self.server.reap_idle_clients()
+
+            # Sleep through to next tick
+            tick_time = asyncio.get_running_loop().time() - tick_start
+            if tick_time < config.tick_interval:
+                await asyncio.sleep(config.tick_interval - tick_time)
+
+    def shutdown(self):
+        """
+        Cannot be run as an asynchronous task, or we get infinite recursion errors
+        trying to get it to cancel itself
+        :return:
+        """
+        logger.info("Shutting down.")
+        loop = asyncio.get_event_loop()
+
+        # Handle connections
+        for client in self.unauthed_clients:
+            loop.run_until_complete(client.close())
+
+        for char in self.authed_chars:
+            loop.run_until_complete(char.async_close())
+
+        # Make sure everything journaled so far is on disk
+        if self.engine is not None:
+            self.engine.close()
+        if self.server is not None and self.server.recorder is not None:
+            self.server.recorder.close()
+
+        # Handle stray tasks
+        pending = asyncio.all_tasks(loop)
+
+        for task in pending:
+            if not task.cancelled():
+                task.cancel()
+
+        with suppress(asyncio.CancelledError):
+            loop.run_until_complete(asyncio.gather(*pending))
+
+        loop.run_until_complete(loop.shutdown_asyncgens())
+
+        logger.info("Shutdown complete.")
+
+    # ----------------------------------
+    # Character/client management
+    # - Track new connections and logins
+    # ----------------------------------
+    def register_client(self, client):
+        """
+        Tracks new clients from the server
+        :param client:
+        :return:
+        """
+        self.unauthed_clients.append(client)
+        logger.info(f"New connection from [{client.remote_ip}].")
+
+        # Authentication is scheduled for asynchronous processing
+        self.auth_tasks[client] = asyncio.create_task(self._authenticate(client))
+
+    async def _authenticate(self, client):
+        """
+        Authenticates the given client, once the system is ready for logins
+        :param client:
+        :return:
+        """
+        if not self.ready.is_set():
+            client.send("Starting up, please wait...")
+            await self.ready.wait()
+
+        if self.startup_failed:
+            client.send("The server failed to start.  Please try again later.")
+            await client.close()
+            return
+
+        return await self.auth.authenticate_client(client)
+
+    def deregister_client(self, client):
+        """
+        Tracks clients that have dropped their connection to the server
+        (intentionally or otherwise)
+        :param client:
+        :return:
+        """
+        # Just drop unauthenticated clients (and stop waiting for them to log in)
+        auth_task = self.auth_tasks.pop(client, None)
+        if auth_task is not None:
+            auth_task.cancel()
+
+        for unauthed in self.unauthed_clients:
+            if unauthed == client:
+                self.unauthed_clients.remove(client)
+                return
+
+        # For authenticated clients, we have to clear the character as well
+        for authed in self.authed_chars:
+            if authed.client == client:
+                self.engine.remove_char(authed)
+                self.authed_chars.remove(authed)
+
+    async def mark_authenticated(self, character):
+        """
+        Tracks characters that have passed through the authentication module
+        :param character:
+        :return:
+        """
+        # Make sure any journaled changes are in the DB before the character loads
+        await self.engine.compact_journal()
+        if character.client not in self.unauthed_clients:
+            # Dropped while we were waiting
+            return
+
+        self.unauthed_clients.remove(character.client)
+        self.auth_tasks.pop(character.client, None)
+        character.client.authenticated = True
+        self.authed_chars.append(character)
+        self.engine.add_char(character)
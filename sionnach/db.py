@@ -35,3 +35,28 @@ class User(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     password = Column(String)
+
+
+class Alias(Base):
+    """
+    Holds per-user command aliases
+    """
+
+    __tablename__ = "aliases"
+
+    id = Column(Integer, primary_key=True)
+    user = Column(String, index=True)
+    name = Column(String)
+    expansion = Column(String)
+
+
+class TableVersion(Base):
+    """
+    Holds change versions for tables whose changes are tracked (see
+    sionnach.snapshot.track_changes)
+    """
+
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer)
@@ -4,11 +4,28 @@ Handles main system logic
 - Performs system updates
 - Sends output to users
 """
-from sionnach import log
+import asyncio
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from sionnach import config, log
+from sionnach.db import Help
+from sionnach.journal import Journal, compact, rotated_journals
+from sionnach.mobiles import Mobiles
+from sionnach.snapshot import (
+    load_tables,
+    refresh_tables,
+    track_changes,
+    write_snapshot,
+)
 from sionnach.util import get_helpfile
 
 logger = log.logger("sionnach.engine")
 
+# DB tables that make up the (static) world state, loaded at startup
+WORLD_TABLES = [Help.__table__]
+
 
 class Engine:
     def __init__(self, db_session):
@@ -17,6 +34,201 @@ class Engine:
 
         self.characters = []
 
+        # World state, as raw table rows (table name -> SnapshotTable)
+        self.world_tables = {}
+        # Whether the world state has changed since the last snapshot
+        self.world_dirty = False
+
+        # Helpfile name -> text
+        self.helpfiles = {}
+
+        # NPC/mobile state
+        self.mobiles = Mobiles(seed=config.random_seed)
+
+        # Action journal, periodically compacted into the DB in the background
+        self.journal = None
+        self._compactor_session = None
+        self._compaction_lock = asyncio.Lock()
+        # The group commit in progress, if any
+        self._commit_task = None
+
+        # Background tasks, referenced here until they finish so that they can't
+        # be garbage collected partway through
+        self._background_tasks = set()
+
+        self.ticks = 0
+
+    # -----------
+    # World state
+    # -----------
+    def load_world(self):
+        """
+        Loads the world state, from the latest snapshot if there is one (reloading
+        any tables that have changed in the DB since it was taken), or else from the
+        DB directly
+        :return:
+        """
+        start = time.perf_counter()
+        if not track_changes(self.db_session, WORLD_TABLES):
+            logger.warning(
+                "World table changes can't be tracked on this DB; "
+                "the world will always be loaded from the DB."
+            )
+        self.world_tables, self.world_dirty = load_tables(
+            self.db_session, WORLD_TABLES, config.snapshot_path
+        )
+        self._index_world()
+
+        logger.info(
+            f"World loaded in {(time.perf_counter() - start) * 1000:.1f}ms "
+            f"({len(self.helpfiles)} helpfile(s))."
+        )
+
+        if self.world_dirty:
+            self.save_world()
+
+    def refresh_world(self):
+        """
+        Picks up any changes made to the world tables in the DB while running.
+        Only tables whose changes are tracked are checked; untracked ones are only
+        reloaded at startup.
+        :return:
+        """
+        self.world_tables, changed = refresh_tables(
+            self.db_session, WORLD_TABLES, self.world_tables, reload_untracked=False
+        )
+        if changed:
+            logger.info("World tables changed in the DB; reloaded.")
+            self._index_world()
+            self.world_dirty = True
+
+    def _index_world(self):
+        """
+        Rebuilds the lookup structures for the current world tables
+        :return:
+        """
+        help_table = self.world_tables[Help.__tablename__]
+        name_index = help_table.columns.index("name")
+        text_index = help_table.columns.index("text")
+        self.helpfiles = {row[name_index]: row[text_index] for row in help_table.rows}
+
+    def save_world(self):
+        """
+        Snapshots the current world state to disk
+        :return:
+        """
+        start = time.perf_counter()
+        write_snapshot(config.snapshot_path, self.world_tables)
+        self.world_dirty = False
+        logger.info(
+            f"World snapshot saved in {(time.perf_counter() - start) * 1000:.1f}ms."
+        )
+
+    def get_helpfile(self, name):
+        """
+        Retrieve the helpfile/static text with the given name, falling back to the
+        DB for helpfiles added since the world was last refreshed
+        :param name:
+        :return:
+        """
+        text = self.helpfiles.get(name)
+        if text is None:
+            return get_helpfile(self.db_session, name)
+        return text
+
+    # -------------
+    # Action journal
+    # -------------
+    def open_journal(self):
+        """
+        Opens the action journal, first folding any journals left over from a
+        previous run (e.g., after a crash) into the DB
+        :return:
+        """
+        self.journal = Journal(config.journal_path)
+        self.journal.rotate()
+        leftovers = rotated_journals(config.journal_path)
+        if leftovers:
+            count = compact(self.db_session, leftovers)
+            logger.info(f"Recovered {count} journaled action(s).")
+
+        # The compactor runs in a worker thread, so it needs its own session
+        self._compactor_session = sessionmaker(bind=self.db_session.get_bind())()
+
+    async def commit_journal(self):
+        """
+        Writes and fsyncs everything journaled so far (group commit), in a worker
+        thread
+        :return:
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.journal.commit)
+
+    async def compact_journal(self):
+        """
+        Folds all committed journal entries into the DB, in a worker thread.
+        Shielded from cancellation, since the worker can't be stopped partway and
+        must keep holding the compaction lock until it finishes.
+        :return:
+        """
+        await asyncio.shield(self._compact_journal())
+
+    async def _compact_journal(self):
+        loop = asyncio.get_running_loop()
+        async with self._compaction_lock:
+            await loop.run_in_executor(None, self.journal.rotate)
+            paths = rotated_journals(config.journal_path)
+            if not paths:
+                return
+
+            count = await loop.run_in_executor(
+                None, compact, self._compactor_session, paths
+            )
+            logger.debug(f"Compacted {count} journaled action(s).")
+
+    async def _background_commit(self):
+        """
+        Per-tick group commit
+        :return:
+        """
+        try:
+            await self.commit_journal()
+        except Exception:
+            logger.exception("Journal commit failed.")
+
+    async def _background_compact(self):
+        """
+        Periodic journal compaction; failed compactions are retried next time
+        :return:
+        """
+        try:
+            await self.compact_journal()
+        except Exception:
+            logger.exception("Journal compaction failed.")
+
+    def _run_in_background(self, coro):
+        """
+        Schedules the given coroutine as a background task, keeping a reference to
+        it until it finishes
+        :param coro:
+        :return: The task
+        """
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def close(self):
+        """
+        Commits any outstanding journal entries
+        :return:
+        """
+        if self.journal is not None:
+            self.journal.close()
+
+    # ----------
+    # Characters
+    # ----------
+
     def add_char(self, character):
         """
         Start tracking a new user in the world
@@ -24,7 +236,7 @@ class Engine:
         """
         self.characters.append(character)
         # Load attributes from DB and perform other initialisation
-        character.init(self.db_session)
+        character.init(self.db_session, self.journal)
 
     def remove_char(self, character):
         """
@@ -33,6 +245,19 @@ class Engine:
         """
         self.characters.remove(character)
 
+    def _process_input(self, character):
+        """
+        Runs every command currently available from the given character
+        (paging and input conveniences are handled as the input is read)
+        :param character:
+        :return:
+        """
+        command = character.get_input()
+        while command is not None:
+            # There are no game commands yet
+            logger.debug(f"({character.name}) Unhandled command: {command}")
+            command = character.get_input()
+
     def tick(self):
         """
         Process actions for each user.
@@ -40,6 +265,30 @@ class Engine:
         Send any extra input to user.
         :return:
         """
+        self.ticks += 1
+
+        # Pick up world changes made in the DB, and snapshot them periodically
+        if self.ticks % config.world_refresh_interval == 0:
+            self.refresh_world()
+        if self.world_dirty and self.ticks % config.snapshot_interval == 0:
+            self.save_world()
+
+        # Player input
+        for char in self.characters:
+            self._process_input(char)
+
+        # NPC updates.  Characters don't have locations yet, so no player rooms are
+        # passed in (and nothing reacts to the resulting events yet)
+        self.mobiles.step()
+
         # Debug
         for char in self.characters:
             char.send(f"<TICK> {len(self.characters)} active connection(s).")
+
+        # Group commit for everything journaled this tick.  If the last commit is
+        # still in progress, this tick's actions just go out with the next one.
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = self._run_in_background(self._background_commit())
+
+        if self.ticks % config.journal_compact_interval == 0:
+            self._run_in_background(self._background_compact())
@@ -32,3 +32,15 @@ class AuthInvalidPassword(Exception):
 
     def __str__(self):
         return repr(self.value)
+
+
+class SnapshotError(Exception):
+    """
+    World state snapshot could not be read or written
+    """
+
+    def __init__(self, value="SnapshotError"):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
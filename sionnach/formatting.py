@@ -0,0 +1,207 @@
+"""
+Text formatting for client output
+- Translates colour markup into ANSI escape sequences (or strips it)
+- Word-wraps text to a given terminal width
+- Splits long text into pages for a given terminal height
+
+Colour markup uses a brace followed by a single code character, e.g.:
+    "{rRed text{x, back to normal.  Use {{ for a literal brace."
+
+Rendered output is cached by (text, width, colour), so static text (helpfiles,
+room descriptions, etc.) only needs to be laid out once per distinct terminal
+profile.
+"""
+import re
+from functools import lru_cache
+
+from sionnach import config
+
+# --[ Colour markup ]-----------------------------------------------------------
+ESC = "\x1b"
+RESET = f"{ESC}[0m"
+
+COLOUR_CODES = {
+    "x": RESET,
+    "d": f"{ESC}[0;30m",
+    "r": f"{ESC}[0;31m",
+    "g": f"{ESC}[0;32m",
+    "y": f"{ESC}[0;33m",
+    "b": f"{ESC}[0;34m",
+    "m": f"{ESC}[0;35m",
+    "c": f"{ESC}[0;36m",
+    "w": f"{ESC}[0;37m",
+    "D": f"{ESC}[1;30m",
+    "R": f"{ESC}[1;31m",
+    "G": f"{ESC}[1;32m",
+    "Y": f"{ESC}[1;33m",
+    "B": f"{ESC}[1;34m",
+    "M": f"{ESC}[1;35m",
+    "C": f"{ESC}[1;36m",
+    "W": f"{ESC}[1;37m",
+}
+
+# Colour code/escaped brace
+_MARKUP = re.compile(r"\{([{" + "".join(COLOUR_CODES) + r"])")
+# A single markup token: either a colour code/escaped brace, or any other character
+_TOKEN = re.compile(r"\{[{" + "".join(COLOUR_CODES) + r"]|.", re.DOTALL)
+
+
+def _ansi_sub(match):
+    code = match.group(1)
+    if code == "{":
+        return "{"
+    return COLOUR_CODES[code]
+
+
+def _plain_sub(match):
+    code = match.group(1)
+    if code == "{":
+        return "{"
+    return ""
+
+
+def colourise(text, colour=True):
+    """
+    Translates the colour markup in the given text into ANSI escape sequences.
+    If `colour` is False, the markup is stripped instead.
+    :param text:
+    :param colour:
+    :return:
+    """
+    if colour:
+        return _MARKUP.sub(_ansi_sub, text)
+    return _MARKUP.sub(_plain_sub, text)
+
+
+def visible_len(text):
+    """
+    Returns the number of characters the given marked-up text takes up on screen
+    :param text:
+    :return:
+    """
+    return len(_MARKUP.sub(_plain_sub, text))
+
+
+# --[ Layout ]------------------------------------------------------------------
+def _split_word(word, width):
+    """
+    Hard-splits a single marked-up word that is too long to fit on one line,
+    without breaking up any colour codes
+    :param word:
+    :param width:
+    :return:
+    """
+    chunks = []
+    chunk = []
+    chunk_len = 0
+    for token in _TOKEN.findall(word):
+        token_len = 0 if len(token) == 2 and token != "{{" else 1
+        if chunk_len + token_len > width:
+            chunks.append("".join(chunk))
+            chunk = []
+            chunk_len = 0
+        chunk.append(token)
+        chunk_len += token_len
+    if chunk:
+        chunks.append("".join(chunk))
+    return chunks
+
+
+def wrap_line(line, width):
+    """
+    Greedily word-wraps a single line of marked-up text to the given width.
+    Leading indentation is preserved on the first wrapped line only.
+    :param line:
+    :param width:
+    :return: List of marked-up lines
+    """
+    if not width or visible_len(line) <= width:
+        return [line]
+
+    stripped = line.lstrip(" ")
+    indent = line[: len(line) - len(stripped)]
+
+    lines = []
+    current = indent
+    current_len = len(indent)
+    has_word = False
+    for word in stripped.split():
+        word_len = visible_len(word)
+
+        if has_word:
+            if current_len + 1 + word_len <= width:
+                current = f"{current} {word}"
+                current_len += 1 + word_len
+                continue
+            lines.append(current)
+            current = ""
+            current_len = 0
+
+        if current_len + word_len <= width:
+            current = f"{current}{word}"
+            current_len += word_len
+        else:
+            # Too long to fit on a line by itself (indent is dropped)
+            *full, current = _split_word(word, width)
+            lines.extend(full)
+            current_len = visible_len(current)
+        has_word = True
+
+    lines.append(current)
+    return lines
+
+
+def _layout(text, width):
+    """
+    Splits the given text into wrapped (marked-up) lines
+    :param text:
+    :param width:
+    :return:
+    """
+    lines = []
+    for line in text.splitlines() or [""]:
+        lines.extend(wrap_line(line, width))
+    return lines
+
+
+@lru_cache(maxsize=config.format_cache_size)
+def render(text, width, colour):
+    """
+    Fully renders the given text for a terminal with the given width and colour
+    capability: wrapped, colourised, and terminated with a newline.
+    Results are cached, so repeated sends of the same static text are cheap.
+    :param text:
+    :param width: Terminal width (0/None to disable wrapping)
+    :param colour: Whether the terminal should receive ANSI colour codes
+    :return:
+    """
+    rendered = "\r\n".join(colourise(line, colour) for line in _layout(text, width))
+    if colour and ESC in rendered:
+        # Don't let colours bleed into whatever comes next
+        rendered += RESET
+    return f"{rendered}\r\n"
+
+
+@lru_cache(maxsize=config.format_cache_size)
+def paginate(text, width, height, colour):
+    """
+    Renders the given text as with `render()`, but split into pages that will fit
+    on a terminal of the given height (leaving one line free for a prompt).
+    :param text:
+    :param width:
+    :param height: Terminal height (0/None to disable paging)
+    :param colour:
+    :return: Tuple of rendered pages
+    """
+    lines = _layout(text, width)
+    page_len = max(height - 1, 1) if height else len(lines)
+
+    pages = []
+    for start in range(0, len(lines), page_len):
+        page = "\r\n".join(
+            colourise(line, colour) for line in lines[start : start + page_len]
+        )
+        if colour and ESC in page:
+            page += RESET
+        pages.append(f"{page}\r\n")
+    return tuple(pages)
@@ -0,0 +1,157 @@
+"""
+Per-character input conveniences
+- Fixed-size command history (for repeating previous commands)
+- Per-character aliases
+- Speedwalk expansion (e.g., ".3n2e" -> n, n, n, e, e)
+
+Everything here is bounded, so that a single line of input can never expand into
+an unbounded amount of work or memory.
+"""
+import re
+
+from sionnach import config
+
+# Speedwalk steps, e.g. "3n" or "e"
+_SPEEDWALK_STEP = re.compile(r"(\d*)([nsewud])")
+_SPEEDWALK = re.compile(r"(?:\d*[nsewud])+")
+
+
+class History:
+    """
+    Ring buffer holding the most recent commands entered by a character
+    """
+
+    def __init__(self, size):
+        self._buffer = [None] * size
+        self._size = size
+        # Index of the slot the next command will be written to
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        """
+        Iterates from the oldest to the most recent command
+        :return:
+        """
+        start = self._next - self._count
+        for i in range(start, self._next):
+            yield self._buffer[i % self._size]
+
+    def add(self, command):
+        """
+        Records a new command, overwriting the oldest one if the buffer is full
+        :param command:
+        :return:
+        """
+        if self._size == 0:
+            return
+        self._buffer[self._next % self._size] = command
+        self._next = (self._next + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def last(self, prefix=""):
+        """
+        Returns the most recent command starting with the given prefix, if any
+        :param prefix:
+        :return:
+        """
+        for i in range(1, self._count + 1):
+            command = self._buffer[(self._next - i) % self._size]
+            if command.startswith(prefix):
+                return command
+        return None
+
+
+class Aliases:
+    """
+    Holds a character's aliases, mapping a single word to one or more commands
+    (separated by `config.command_separator`)
+    """
+
+    def __init__(self):
+        self._aliases = {}
+
+    def __len__(self):
+        return len(self._aliases)
+
+    def __iter__(self):
+        return iter(sorted(self._aliases.items()))
+
+    def set(self, name, expansion):
+        """
+        Defines (or redefines) an alias
+        :param name:
+        :param expansion:
+        :return: An error message if the alias could not be set, otherwise None
+        """
+        name = name.lower()
+        if name not in self._aliases and len(self._aliases) >= config.max_aliases:
+            return f"You cannot have more than {config.max_aliases} aliases."
+        if len(expansion) > config.max_input_length:
+            return (
+                f"Aliases cannot be longer than {config.max_input_length} characters."
+            )
+
+        self._aliases[name] = expansion
+        return None
+
+    def remove(self, name):
+        """
+        Removes an alias
+        :param name:
+        :return: True if the alias existed, False otherwise
+        """
+        return self._aliases.pop(name.lower(), None) is not None
+
+    def expand(self, line):
+        """
+        Expands the alias (if any) at the start of the given line.
+        Any text after the alias name replaces "$*" in the expansion, or is
+        appended to it if there is no "$*".
+        The expansion is not itself checked for aliases, so alias definitions can
+        never recurse.
+        Expanded lines are held to `config.max_input_length`, like typed ones; the
+        length is checked before anything is substituted.
+        :param line:
+        :return: The expanded line, or None if it would be too long
+        """
+        name, _, args = line.partition(" ")
+        expansion = self._aliases.get(name.lower())
+        if expansion is None:
+            return line
+
+        substitutions = expansion.count("$*")
+        if substitutions:
+            length = len(expansion) + substitutions * (len(args) - len("$*"))
+        else:
+            length = len(expansion) + (len(args) + 1 if args else 0)
+        if length > config.max_input_length:
+            return None
+
+        if substitutions:
+            return expansion.replace("$*", args)
+        if args:
+            return f"{expansion} {args}"
+        return expansion
+
+
+def expand_speedwalk(command, limit):
+    """
+    Expands a speedwalk string (without its prefix) into a list of directions
+    :param command: E.g., "3n2e"
+    :param limit: Maximum number of directions to return
+    :return: List of directions, or None if the command is not a valid speedwalk
+    """
+    if not _SPEEDWALK.fullmatch(command):
+        return None
+
+    directions = []
+    for count, direction in _SPEEDWALK_STEP.findall(command):
+        repeat = min(int(count) if count else 1, limit - len(directions))
+        directions.extend([direction] * repeat)
+        if len(directions) >= limit:
+            break
+    return directions
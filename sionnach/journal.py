@@ -0,0 +1,189 @@
+"""
+Write-ahead journal of player actions
+- Actions are appended to an in-memory buffer in the hot path
+- Buffered actions are written and fsynced together once per tick (group commit),
+  which can safely happen in a worker thread
+- A compactor periodically folds the journal into the main DB, in a single
+  transaction, and discards it
+
+Record layout (little-endian): payload length (I), payload CRC32 (I), payload
+(UTF-8 JSON: [action, data]).
+A torn or corrupt record (e.g., from a crash mid-write) ends the journal.
+
+Appliers (see APPLIERS) must be idempotent, since a crash between committing the
+DB transaction and discarding the journal will see it applied again on restart.
+"""
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from sionnach import log
+from sionnach.db import Alias
+
+logger = log.logger(__name__)
+
+_RECORD = struct.Struct("<II")
+
+
+class Journal:
+    def __init__(self, path):
+        self.path = path
+
+        # Encoded records waiting for the next group commit
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        # Held while writing to (or replacing) the journal file, so that commits
+        # from worker threads go to disk one at a time and in order
+        self._file_lock = threading.RLock()
+        # Whether the active journal file has any records in it
+        self.has_records = os.path.exists(path) and os.path.getsize(path) > 0
+
+        self._file = open(path, "ab")
+
+    def record(self, action, **data):
+        """
+        Buffers an action for the next commit.  Cheap enough for the hot path.
+        :param action: Action name (see APPLIERS)
+        :param data: JSON-serialisable action data
+        :return:
+        """
+        payload = json.dumps([action, data], separators=(",", ":")).encode()
+        header = _RECORD.pack(len(payload), zlib.crc32(payload))
+        with self._pending_lock:
+            self._pending.append(header + payload)
+
+    def commit(self):
+        """
+        Writes and fsyncs all buffered actions in one go.
+        Safe to call from a worker thread; actions recorded while the commit is in
+        progress are left for the next one.
+        :return:
+        """
+        with self._file_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            self._file.write(b"".join(pending))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.has_records = True
+
+    def rotate(self):
+        """
+        Commits any buffered actions, then moves the active journal aside for
+        compaction and starts a fresh one.  Safe to call from a worker thread.
+        :return: The path of the rotated journal, or None if it was empty
+        """
+        with self._file_lock:
+            self.commit()
+            if not self.has_records:
+                return None
+
+            self._file.close()
+            rotated_path = f"{self.path}.{time.time_ns()}"
+            os.replace(self.path, rotated_path)
+            self._file = open(self.path, "ab")
+            self.has_records = False
+            return rotated_path
+
+    def close(self):
+        """
+        Commits any buffered actions and closes the journal file (waiting for any
+        commit in progress to finish first)
+        :return:
+        """
+        with self._file_lock:
+            self.commit()
+            self._file.close()
+
+
+def read_journal(path):
+    """
+    Yields the (action, data) records in the journal at the given path, stopping
+    at the first torn or corrupt record
+    :param path:
+    :return:
+    """
+    with open(path, "rb") as f:
+        buf = f.read()
+
+    offset = 0
+    while offset + _RECORD.size <= len(buf):
+        length, crc = _RECORD.unpack_from(buf, offset)
+        offset += _RECORD.size
+        payload = buf[offset : offset + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            logger.warning(f"Discarding corrupt journal tail in '{path}'.")
+            return
+        offset += length
+
+        action, data = json.loads(payload)
+        yield action, data
+
+
+def compact(db_session, paths):
+    """
+    Folds the given (rotated) journals into the DB in a single transaction, then
+    deletes them
+    :param db_session: SQLAlchemy database session
+    :param paths: Journal paths, oldest first
+    :return: Number of actions applied
+    """
+    count = 0
+    try:
+        for path in paths:
+            for action, data in read_journal(path):
+                APPLIERS[action](db_session, **data)
+                count += 1
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+
+    for path in paths:
+        os.remove(path)
+    return count
+
+
+def rotated_journals(path):
+    """
+    Returns the paths of any rotated journals left over for the journal at the
+    given path, oldest first
+    :param path:
+    :return:
+    """
+    rotated = glob.glob(f"{glob.escape(path)}.*")
+    suffixes = {p: p[len(path) + 1 :] for p in rotated}
+    return sorted(
+        (p for p in rotated if suffixes[p].isdigit()), key=lambda p: int(suffixes[p])
+    )
+
+
+# --[ Appliers ]-----------------------------------------------------------------
+def _apply_alias_set(db_session, user, name, expansion):
+    alias = (
+        db_session.query(Alias)
+        .filter(Alias.user == user, Alias.name == name)
+        .one_or_none()
+    )
+    if alias is None:
+        db_session.add(Alias(user=user, name=name, expansion=expansion))
+    else:
+        alias.expansion = expansion
+
+
+def _apply_alias_remove(db_session, user, name):
+    db_session.query(Alias).filter(Alias.user == user, Alias.name == name).delete()
+
+
+# Action name -> function(db_session, **data) that applies it to the DB
+APPLIERS = {
+    "alias_set": _apply_alias_set,
+    "alias_remove": _apply_alias_remove,
+}
@@ -0,0 +1,183 @@
+"""
+NPC/mobile state and per-tick updates
+- Mobile state is held as struct-of-arrays (one NumPy column per attribute)
+- Each tick's updates (regeneration, wandering, aggression, death) run as batch
+  operations over whole columns
+- Only mobiles that changed in some visible way are turned into events
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# Exit directions, in column order for the `exits` array
+DIRECTIONS = ("n", "e", "s", "w", "u", "d")
+
+# Flag bits
+ALIVE = 1
+WANDERS = 2
+AGGRESSIVE = 4
+# Set on aggressive mobiles that have already noticed a player in their room
+ENGAGED = 8
+
+MoveEvent = namedtuple("MoveEvent", ["mobile", "source", "destination"])
+AggroEvent = namedtuple("AggroEvent", ["mobile", "room"])
+DeathEvent = namedtuple("DeathEvent", ["mobile", "room"])
+
+
+class Mobiles:
+    _COLUMNS = ("hp", "max_hp", "regen", "room", "move_timer", "move_interval", "flags")
+
+    def __init__(self, exits=(), capacity=1024, seed=None):
+        """
+        :param exits: Array of shape (room count, len(DIRECTIONS)) holding the
+            destination room for each exit, or -1 where there is no exit
+        :param capacity: Initial number of mobile slots
+        :param seed: Random seed (for reproducible wandering)
+        """
+        self.exits = np.asarray(exits, dtype=np.int32).reshape(-1, len(DIRECTIONS))
+        self.rng = np.random.default_rng(seed)
+
+        # Number of slots in use (live or free); all columns are sliced to this
+        self.count = 0
+        # Slots freed by dead mobiles, for reuse
+        self._free = []
+
+        self.hp = np.zeros(capacity, dtype=np.int32)
+        self.max_hp = np.zeros(capacity, dtype=np.int32)
+        self.regen = np.zeros(capacity, dtype=np.int32)
+        self.room = np.zeros(capacity, dtype=np.int32)
+        self.move_timer = np.zeros(capacity, dtype=np.int32)
+        self.move_interval = np.zeros(capacity, dtype=np.int32)
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+
+    def __len__(self):
+        return self.count - len(self._free)
+
+    # ---------------
+    # Spawning/damage
+    # ---------------
+    def spawn(self, room, hp, regen=0, move_interval=0, aggressive=False):
+        """
+        Adds a new mobile
+        :param room: Starting room (must have a row in `exits`)
+        :param hp: Starting (and maximum) hp
+        :param regen: Hp regenerated per tick
+        :param move_interval: Ticks between wanders (0 for stationary mobiles)
+        :param aggressive: Whether the mobile reacts to players entering its room
+        :return: The new mobile's id
+        """
+        if not 0 <= room < len(self.exits):
+            raise ValueError(f"Room {room} does not exist ({len(self.exits)} rooms).")
+
+        if self._free:
+            mobile = self._free.pop()
+        else:
+            if self.count == len(self.hp):
+                self._grow()
+            mobile = self.count
+            self.count += 1
+
+        self.hp[mobile] = hp
+        self.max_hp[mobile] = hp
+        self.regen[mobile] = regen
+        self.room[mobile] = room
+        self.move_timer[mobile] = move_interval
+        self.move_interval[mobile] = move_interval
+        self.flags[mobile] = (
+            ALIVE
+            | (WANDERS if move_interval else 0)
+            | (AGGRESSIVE if aggressive else 0)
+        )
+        return mobile
+
+    def damage(self, mobiles, amounts):
+        """
+        Deals damage to the given mobiles (deaths are handled on the next step)
+        :param mobiles: Mobile id(s)
+        :param amounts: Damage amount(s)
+        :return:
+        """
+        np.subtract.at(self.hp, mobiles, amounts)
+
+    def _grow(self):
+        """
+        Doubles the capacity of every column
+        :return:
+        """
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(max(len(column) * 2, 1), dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+
+    # -----
+    # Ticks
+    # -----
+    def step(self, player_rooms=()):
+        """
+        Advances every mobile by one tick
+        :param player_rooms: Rooms that currently have players in them
+        :return: List of events for the mobiles that visibly changed
+        """
+        n = self.count
+        hp = self.hp[:n]
+        room = self.room[:n]
+        flags = self.flags[:n]
+        alive = (flags & ALIVE) != 0
+
+        events = []
+
+        # Deaths
+        died = alive & (hp <= 0)
+        if died.any():
+            dead = np.flatnonzero(died)
+            flags[dead] = 0
+            self._free.extend(dead.tolist())
+            events.extend(
+                map(DeathEvent._make, zip(dead.tolist(), room[dead].tolist()))
+            )
+            alive &= ~died
+
+        # Regeneration
+        np.minimum(hp + np.where(alive, self.regen[:n], 0), self.max_hp[:n], out=hp)
+
+        # Wandering
+        timer = self.move_timer[:n]
+        wanders = alive & ((flags & WANDERS) != 0)
+        timer[wanders] -= 1
+        due = np.flatnonzero(wanders & (timer <= 0))
+        if len(due) and len(self.exits):
+            timer[due] = self.move_interval[:n][due]
+            directions = self.rng.integers(0, len(DIRECTIONS), size=len(due))
+            source = room[due]
+            destination = self.exits[source, directions]
+
+            moved = destination >= 0
+            movers = due[moved]
+            room[movers] = destination[moved]
+            # Moving resets aggression
+            flags[movers] &= ~np.uint8(ENGAGED)
+            events.extend(
+                map(
+                    MoveEvent._make,
+                    zip(
+                        movers.tolist(),
+                        source[moved].tolist(),
+                        destination[moved].tolist(),
+                    ),
+                )
+            )
+
+        # Aggression
+        aggressive = alive & ((flags & AGGRESSIVE) != 0)
+        occupied = np.isin(room, np.asarray(player_rooms, dtype=np.int32))
+        engaged = (flags & ENGAGED) != 0
+        flags[aggressive & engaged & ~occupied] &= ~np.uint8(ENGAGED)
+        noticed = np.flatnonzero(aggressive & ~engaged & occupied)
+        if len(noticed):
+            flags[noticed] |= ENGAGED
+            events.extend(
+                map(AggroEvent._make, zip(noticed.tolist(), room[noticed].tolist()))
+            )
+
+        return events
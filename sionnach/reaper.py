@@ -0,0 +1,114 @@
+"""
+Idle connection management
+- Drops clients that stay idle for too long, and clients that haven't logged in
+  within a set time of connecting (however active they are)
+- Sends telnet keepalives to quiet clients, so that dead peers are noticed
+
+All clients share a single heap of check times.  Receiving input only updates the
+client's `last_active` time; heap entries that turn out to be stale are simply
+rescheduled when they come up, so there is no per-input or per-client timer cost.
+"""
+import asyncio
+import heapq
+import itertools
+
+from sionnach import config, log
+
+logger = log.logger(__name__)
+
+
+class Reaper:
+    def __init__(self):
+        # (check time, tiebreaker, client)
+        self._heap = []
+        self._counter = itertools.count()
+
+        # Clients currently being tracked.  Heap entries for other clients are
+        # discarded when they come up.
+        self._tracked = set()
+
+    def __len__(self):
+        return len(self._tracked)
+
+    def track(self, client, now):
+        """
+        Starts tracking a new client
+        :param client:
+        :param now: Current event loop time
+        :return:
+        """
+        client.connected_at = now
+        client.last_active = now
+        client.last_keepalive = now
+        self._tracked.add(client)
+        self._schedule(client, now)
+
+    def untrack(self, client):
+        """
+        Stops tracking a client (e.g., once it has disconnected)
+        :param client:
+        :return:
+        """
+        self._tracked.discard(client)
+
+    def sweep(self, now):
+        """
+        Handles every client whose check time has come up: sends keepalives to
+        quiet clients and drops expired ones (as a single batch)
+        :param now: Current event loop time
+        :return: List of dropped clients
+        """
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, client = heapq.heappop(self._heap)
+            if client not in self._tracked:
+                continue
+            if client.kill_switch.done() or client.closed.done():
+                # Already closing or gone; stop tracking
+                self._tracked.discard(client)
+                continue
+
+            if now >= self._expiry(client):
+                self._tracked.discard(client)
+                expired.append(client)
+                continue
+
+            quiet_since = max(client.last_active, client.last_keepalive)
+            if now - quiet_since >= config.keepalive_interval:
+                client.send_keepalive()
+                client.last_keepalive = now
+
+            self._schedule(client, now)
+
+        if expired:
+            logger.info(f"Dropping {len(expired)} idle client(s).")
+            for client in expired:
+                client.send("Idle timeout.")
+                asyncio.create_task(client.close())
+
+        return expired
+
+    # ---------------------------
+    # Private helpers
+    def _expiry(self, client):
+        """
+        Returns the time at which the given client will be dropped: once it has
+        been idle for too long, or (before it logs in) once its time to log in is up
+        :param client:
+        :return:
+        """
+        if client.authenticated:
+            return client.last_active + config.idle_timeout
+        return client.connected_at + config.login_timeout
+
+    def _schedule(self, client, now):
+        """
+        Queues the next check for the given client: either its expiry or its next
+        keepalive, whichever comes first
+        :param client:
+        :param now:
+        :return:
+        """
+        quiet_since = max(client.last_active, client.last_keepalive)
+        check = min(self._expiry(client), quiet_since + config.keepalive_interval)
+        heapq.heappush(self._heap, (max(check, now), next(self._counter), client))
@@ -7,8 +7,11 @@ Higher-level functionality is handled by the Character class
 """
 import asyncio
 from asyncio import CancelledError, FIRST_COMPLETED, StreamReader, StreamWriter
+from contextlib import suppress
 
-from sionnach import config, log
+from sionnach import config, formatting, log
+from sionnach.reaper import Reaper
+from sionnach.trace import TraceRecorder
 
 logger = log.logger(__name__)
 
@@ -23,6 +26,12 @@ class Server:
         self.server = None
         self.clients = []
 
+        # Drops idle clients
+        self.reaper = Reaper()
+
+        # Records client input for offline replay, if enabled
+        self.recorder = TraceRecorder(config.trace_path) if config.trace_path else None
+
     async def start_server(self):
         self.server = await asyncio.start_server(
             self.handle_new_client, "127.0.0.1", config.port
@@ -31,18 +40,43 @@ class Server:
         logger.info(f"Serving on port {config.port}.")
 
     async def handle_new_client(self, reader, writer):
-        client = Client(reader, writer)
+        await self.serve_client(Client(reader, writer))
+
+    async def serve_client(self, client):
+        """
+        Registers the given client and services it until it disconnects
+        :param client:
+        :return:
+        """
         self.clients.append(client)
+        self.reaper.track(client, asyncio.get_running_loop().time())
+        client.recorder = self.recorder
+        if self.recorder is not None:
+            self.recorder.record(client, "connect")
+
         self.register_client(client)
         await client.communicate_until_closed()
         self.deregister_client(client)
 
+        if self.recorder is not None:
+            self.recorder.record(client, "disconnect")
+        self.reaper.untrack(client)
+        self.clients.remove(client)
+
+    def reap_idle_clients(self):
+        """
+        Sends keepalives to quiet clients and drops idle ones
+        :return:
+        """
+        return self.reaper.sweep(asyncio.get_running_loop().time())
+
 
 class Client:
-    def __init__(self, reader: StreamReader, writer: StreamWriter):
+    def __init__(self, reader: StreamReader, writer: StreamWriter, recorder=None):
         self.reader = reader
         self.writer = writer
-        self.remote_ip = writer.get_extra_info("peername")[0]
+        self.remote_ip = writer.get_extra_info("peername")[0] if writer else None
+        self.recorder = recorder
 
         self.input_queue = asyncio.Queue()
         self.output_queue = asyncio.Queue()
@@ -52,6 +86,31 @@ class Client:
         # Which will trigger resolution on this Future.
         self.closed = asyncio.get_running_loop().create_future()
 
+        # Terminal profile, used for formatting output (the size is updated via NAWS;
+        # colour can be toggled by the player)
+        self.width = config.default_width
+        self.height = config.default_height
+        self.colour = config.ansi_colour
+
+        # Remaining pages of paged output, if any
+        self.pending_pages = []
+
+        # Whether input is currently being treated as a password
+        self.password_mode = False
+
+        # Telnet parser state, and input received so far that isn't a full line yet
+        self._telnet_state = _DATA
+        self._subnegotiation = bytearray()
+        self._line_buffer = bytearray()
+
+        # Whether the client has logged in (which affects its idle timeout)
+        self.authenticated = False
+        # Event loop times of connection, the last input received and the last
+        # keepalive sent
+        self.connected_at = asyncio.get_running_loop().time()
+        self.last_active = self.connected_at
+        self.last_keepalive = self.connected_at
+
     async def communicate_until_closed(self):
         """
         Start up the sub-tasks:
@@ -62,6 +121,9 @@ class Client:
         """
         logger.debug(f"({self.remote_ip}) New client.")
 
+        # Ask for the client's window size
+        self.send_raw(bytes([IAC, DO, NAWS]))
+
         receive_task = asyncio.create_task(self._receive_to_queue())
         send_task = asyncio.create_task(self._send_from_queue())
 
@@ -96,22 +158,53 @@ class Client:
         the client is fully dropped.
         :return:
         """
-        self.kill_switch.set_result(True)
+        if not self.kill_switch.done():
+            self.kill_switch.set_result(True)
         return await self.closed
 
     def send(self, msg):
         """
         Synchronous method that sends a given message to this client as soon as
         possible.
+        The message is formatted (colourised, word-wrapped and given a trailing
+        newline) for this client's terminal first.
+        :param msg:
+        :return:
+        """
+        self.send_raw(formatting.render(msg, self.width, self.colour))
+
+    def send_paged(self, msg):
+        """
+        Synchronous method that sends the first page of the given message to this
+        client, holding the remaining pages (if any) until `next_page()` is called.
         :param msg:
         :return:
         """
+        pages = formatting.paginate(msg, self.width, self.height, self.colour)
+        self.pending_pages = list(pages[1:])
+        self.send_raw(pages[0])
+        if self.pending_pages:
+            self.send_raw(config.more_prompt)
+
+    def next_page(self):
+        """
+        Sends the next pending page of paged output, if any.
+        :return: True if a page was sent, False otherwise
+        """
+        if not self.pending_pages:
+            return False
 
-        # Add a newline for the client if necessary
-        if msg[-2:] != "\r\n":
-            msg = f"{msg}\r\n"
+        self.send_raw(self.pending_pages.pop(0))
+        if self.pending_pages:
+            self.send_raw(config.more_prompt)
+        return True
 
-        self.send_raw(msg)
+    def discard_pages(self):
+        """
+        Drops any pending pages of paged output
+        :return:
+        """
+        self.pending_pages.clear()
 
     def send_raw(self, msg):
         """
@@ -126,7 +219,27 @@ class Client:
         Read something from the client's input queue, blocking until successful
         :return:
         """
-        return await self.input_queue.get()
+        arrived, msg = await self.input_queue.get()
+        self._record_input(arrived, msg)
+        return msg
+
+    def receive_nowait(self):
+        """
+        Read something from the client's input queue, raising QueueEmpty if there is
+        nothing there
+        :return:
+        """
+        arrived, msg = self.input_queue.get_nowait()
+        self._record_input(arrived, msg)
+        return msg
+
+    def send_keepalive(self):
+        """
+        Send IAC NOP, which clients ignore but which will fail on a dead connection.
+        (AYT would also work, but most clients display a response to it.)
+        :return:
+        """
+        self.send_raw(bytes([IAC, NOP]))
 
     def set_password_mode(self, mode):
         """
@@ -136,6 +249,7 @@ class Client:
         :param mode:
         :return:
         """
+        self.password_mode = mode
         if mode:
             self.send_raw(bytes([IAC, WILL, ECHO]))
         else:
@@ -145,34 +259,154 @@ class Client:
     # Private helpers
     async def _receive_to_queue(self):
         """
-        Read complete lines of input from the client socket into its input queue
+        Read raw input from the client socket, handling telnet commands as they
+        arrive, and put complete lines of input into its input queue
         :return:
         """
         try:
-            msg = await self.reader.readline()
-
-            # Watch for telnet commands
-            while len(msg) > 0 and msg[0] == IAC:
-                # Just strip them for now
-                msg = msg[3:]
+            while True:
+                data = await self._read()
 
-            # "If the EOF was received and the internal buffer is empty,
-            # return an empty bytes object."
-            if msg == b"":
-                logger.debug(f"({self.remote_ip}) Client closed socket.")
-                return
+                # "If the EOF was received and the internal buffer is empty,
+                # return an empty bytes object."
+                if data == b"":
+                    logger.debug(f"({self.remote_ip}) Client closed socket.")
+                    # Any unterminated last line still counts as input
+                    if self._line_buffer:
+                        await self._queue_line(bytes(self._line_buffer))
+                    return
 
-            msg = msg.decode().strip()[0 : config.max_input_length]
-            logger.debug(f"({self.remote_ip}) [RECV] {msg}")
+                self.last_active = asyncio.get_running_loop().time()
 
-            # Register as next available input from client
-            await self.input_queue.put(msg)
-
-            return await self._receive_to_queue()
+                for line in self._feed(data):
+                    await self._queue_line(line)
 
+        except ConnectionError:
+            logger.debug(f"({self.remote_ip}) Client connection lost.")
         except CancelledError:
             logger.debug(f"({self.remote_ip}) Receiver cancelled.")
 
+    async def _queue_line(self, line):
+        """
+        Decodes a complete line of raw input and registers it as the next available
+        input from the client
+        :param line: The line (in raw bytes, with telnet commands already removed)
+        :return:
+        """
+        # Truncate before decoding, so oversized lines cost no extra work
+        msg = line[0 : config.max_input_length].decode(errors="ignore").strip()
+        logger.debug(f"({self.remote_ip}) [RECV] {msg}")
+
+        # Queued with its arrival time, for the trace recorder
+        await self.input_queue.put((asyncio.get_running_loop().time(), msg))
+
+    def _record_input(self, arrived, msg):
+        """
+        Records a line of input in the trace (if enabled) as it is used.
+        Clients can type ahead, so whether a line is a password is only known at
+        this point; passwords are masked, so they are never written to disk.
+        :param arrived: Event loop time the line was received at
+        :param msg:
+        :return:
+        """
+        if self.recorder is not None:
+            data = "*" * 8 if self.password_mode else msg
+            self.recorder.record(self, "input", data, now=arrived)
+
+    async def _read(self):
+        """
+        Low level function to read a chunk of raw input from the client
+        :return: The input (in raw bytes), or b"" on EOF
+        """
+        return await self.reader.read(config.read_size)
+
+    def _feed(self, data):
+        """
+        Runs a chunk of raw input through the telnet parser and splits the
+        remaining data into lines
+        :param data:
+        :return: List of the complete lines of input (in raw bytes) now available
+        """
+        if self._telnet_state == _DATA and IAC not in data:
+            # Fast path for plain text
+            self._line_buffer += data
+        else:
+            self._line_buffer += self._process_telnet(data)
+
+        if b"\n" not in self._line_buffer:
+            # Anything past the input limit would be truncated anyway
+            del self._line_buffer[config.max_input_length :]
+            return []
+
+        *lines, rest = self._line_buffer.split(b"\n")
+        self._line_buffer = rest[: config.max_input_length]
+        return lines
+
+    def _process_telnet(self, data):
+        """
+        Strips telnet commands out of the given chunk of raw input, handling the
+        ones we care about (currently just NAWS).
+        Commands may be split across chunks (or lines), so the parser state is kept
+        between calls.
+        :param data:
+        :return: The input with all telnet commands removed
+        """
+        out = bytearray()
+        state = self._telnet_state
+        for byte in data:
+            if state == _DATA:
+                if byte == IAC:
+                    state = _IAC
+                else:
+                    out.append(byte)
+            elif state == _IAC:
+                if byte == IAC:
+                    # Escaped literal 255
+                    out.append(IAC)
+                    state = _DATA
+                elif byte == SB:
+                    self._subnegotiation = bytearray()
+                    state = _SB
+                elif byte in (WILL, WONT, DO, DONT):
+                    state = _OPTION
+                else:
+                    state = _DATA
+            elif state == _OPTION:
+                # Option negotiations are currently ignored
+                state = _DATA
+            elif state == _SB:
+                if byte == IAC:
+                    state = _SB_IAC
+                elif len(self._subnegotiation) < _MAX_SUBNEGOTIATION:
+                    self._subnegotiation.append(byte)
+            elif state == _SB_IAC:
+                if byte == IAC:
+                    self._subnegotiation.append(IAC)
+                    state = _SB
+                else:
+                    # IAC SE (or a malformed subnegotiation, which ends here too)
+                    self._subnegotiate(bytes(self._subnegotiation))
+                    state = _DATA
+
+        self._telnet_state = state
+        return out
+
+    def _subnegotiate(self, params):
+        """
+        Handles the parameters of a telnet subnegotiation (IAC SB ... IAC SE)
+        :param params:
+        :return:
+        """
+        if len(params) == 5 and params[0] == NAWS:
+            width = params[1] << 8 | params[2]
+            height = params[3] << 8 | params[4]
+            # Zero means "unknown"; keep the defaults for those
+            if width:
+                self.width = width
+            if height:
+                self.height = height
+            logger.debug(f"({self.remote_ip}) NAWS: {self.width}x{self.height}")
+
     async def _send_from_queue(self):
         """
         Send messages to the client from its output queue
@@ -180,18 +414,22 @@ class Client:
         """
         # Lazily get queued messages and send them
         try:
-            msg = await self.output_queue.get()
-            await self._send_msg(msg)
-
-            return await self._send_from_queue()
+            while True:
+                msg = await self.output_queue.get()
+                await self._send_msg(msg)
 
+        except ConnectionError:
+            # (e.g., a keepalive sent to a dead peer)
+            logger.debug(f"({self.remote_ip}) Client connection lost.")
         except CancelledError:
             await self.output_queue.put("Server closed connection.  Goodbye.")
 
-            # Flush any remaining messages immediately
-            while self.output_queue.qsize() > 0:
-                msg = self.output_queue.get_nowait()
-                await self._send_msg(msg)
+            # Flush any remaining messages immediately (unless the connection is
+            # already gone)
+            with suppress(ConnectionError):
+                while self.output_queue.qsize() > 0:
+                    msg = self.output_queue.get_nowait()
+                    await self._send_msg(msg)
 
             logger.debug(f"({self.remote_ip}) Sender cancelled.")
 
@@ -217,10 +455,18 @@ class Client:
             msg = msg.encode()
 
         # Perform actual write (message in raw bytes)
-        self.writer.write(msg)
-        await self.writer.drain()
+        await self._write(msg)
         logger.debug(f"({self.remote_ip}) [SEND] {msg_preview}")
 
+    async def _write(self, data):
+        """
+        Low level function to write raw bytes to the client socket
+        :param data:
+        :return:
+        """
+        self.writer.write(data)
+        await self.writer.drain()
+
     async def _close_socket(self):
         """
         Gracefully kick the client
@@ -228,7 +474,8 @@ class Client:
         """
         # Goodbye
         self.writer.close()
-        await self.writer.wait_closed()
+        with suppress(ConnectionError):
+            await self.writer.wait_closed()
 
 
 # --[ Telnet Commands ]---------------------------------------------------------
@@ -260,3 +507,13 @@ SGA = 3  # Suppress Go-Ahead
 TTYPE = 24  # Terminal Type
 NAWS = 31  # Negotiate About Window Size
 LINEMO = 34  # Line Mode
+
+# --[ Telnet Parser States ]----------------------------------------------------
+_DATA = 0  # Plain data
+_IAC = 1  # After IAC
+_OPTION = 2  # After IAC WILL/WONT/DO/DONT
+_SB = 3  # Inside a subnegotiation
+_SB_IAC = 4  # After IAC inside a subnegotiation
+
+# Subnegotiation parameters past this length are ignored
+_MAX_SUBNEGOTIATION = 64
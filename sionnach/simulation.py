@@ -0,0 +1,322 @@
+"""
+Deterministic, socket-free simulation of the server, for profiling and for
+reproducing problems offline
+- MemoryClient: an in-memory stand-in for a socket Client
+- VirtualTimeLoop: an event loop whose clock jumps straight to the next scheduled
+  event whenever there is nothing left to run, so ticks and timeouts cost no real
+  time
+- Simulation: replays an input trace (see sionnach.trace) against the full
+  controller (DB, engine, authentication) as fast as possible.  Recorded passwords
+  are masked, so every password is accepted during replay.
+
+Usage: python -m sionnach.simulation <trace> [--db <uri>] [--session <n>] [--profile]
+"""
+import argparse
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import selectors
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+
+import bcrypt
+
+from sionnach import config, log
+from sionnach.controller import Act
+from sionnach.server import Client
+from sionnach.trace import read_trace
+
+SimulationResult = namedtuple(
+    "SimulationResult", ["transcripts", "tick_times", "virtual_time", "real_time"]
+)
+
+
+class MemoryClient(Client):
+    """
+    A Client that talks to an in-memory buffer instead of a socket
+    """
+
+    def __init__(self, name):
+        super().__init__(reader=None, writer=None)
+        self.remote_ip = name
+
+        # Everything sent to the client, in raw bytes
+        self.output = []
+
+        self._lines = asyncio.Queue()
+
+    def feed(self, line):
+        """
+        Queues a line of input, as if the client had typed it
+        :param line:
+        :return:
+        """
+        self._lines.put_nowait(f"{line}\r\n".encode())
+
+    def disconnect(self):
+        """
+        Closes the connection from the client's end
+        :return:
+        """
+        self._lines.put_nowait(b"")
+
+    @property
+    def transcript(self):
+        return b"".join(self.output).decode(errors="replace")
+
+    async def _read(self):
+        return await self._lines.get()
+
+    async def _write(self, data):
+        self.output.append(data)
+
+    async def _close_socket(self):
+        pass
+
+
+class _InlineExecutor(ThreadPoolExecutor):
+    """
+    Runs submitted work immediately on the calling thread, so that simulations
+    stay deterministic
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """
+    Never blocks; advances the owning loop's virtual clock instead
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            raise RuntimeError("Simulation stalled: nothing is scheduled to run.")
+
+        self.loop.virtual_time += timeout
+        return ready
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        self.virtual_time = 0.0
+
+        selector = _VirtualSelector()
+        super().__init__(selector)
+        selector.loop = self
+
+        self.set_default_executor(_InlineExecutor())
+
+    def time(self):
+        return self.virtual_time
+
+
+@contextmanager
+def _patched(target, **overrides):
+    """
+    Temporarily overrides attributes of the given object (e.g., config values)
+    :param target:
+    :param overrides:
+    :return:
+    """
+    original = {name: getattr(target, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in original.items():
+            setattr(target, name, value)
+
+
+_hashpw = bcrypt.hashpw
+
+
+def _accept_any_password(password, hashed_password):
+    """
+    Stands in for bcrypt.checkpw during replay, since recorded passwords are
+    masked.  Still does the hashing work, so that replayed logins cost as much as
+    real ones.
+    :param password:
+    :param hashed_password:
+    :return:
+    """
+    _hashpw(password, hashed_password)
+    return True
+
+
+class Simulation:
+    def __init__(self, trace, db_uri=None, tail=None, quiet=True):
+        """
+        :param trace: List of trace events (see sionnach.trace.read_trace)
+        :param db_uri: DB to run against.  Defaults to a scratch copy of the
+            configured SQLite DB, so the real one is never modified.
+        :param tail: How long to keep running after the last event (in virtual s;
+            defaults to two ticks)
+        :param quiet: Whether to suppress logging below WARNING while running
+        """
+        self.trace = trace
+        self.db_uri = db_uri
+        self.tail = 2 * config.tick_interval if tail is None else tail
+        self.quiet = quiet
+
+    def run(self):
+        """
+        Replays the trace
+        :return: SimulationResult
+        """
+        root_logger = logging.getLogger()
+        log_level = root_logger.level
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_uri = self.db_uri or self._scratch_db(tmp_dir)
+            with _patched(
+                config,
+                db_uri=db_uri,
+                snapshot_path=os.path.join(tmp_dir, "world.snapshot"),
+                journal_path=os.path.join(tmp_dir, "actions.journal"),
+                trace_path=None,
+                random_seed=0,
+            ), _patched(bcrypt, checkpw=_accept_any_password):
+                if self.quiet:
+                    root_logger.setLevel(logging.WARNING)
+                loop = VirtualTimeLoop()
+                try:
+                    return loop.run_until_complete(self._replay())
+                finally:
+                    loop.close()
+                    root_logger.setLevel(log_level)
+
+    # ---------------------------
+    # Private helpers
+    async def _replay(self):
+        loop = asyncio.get_running_loop()
+        real_start = time.perf_counter()
+
+        act = Act()
+        await act.start()
+        act.start_time = loop.time()
+
+        # Time each world update (in real ms)
+        tick_times = []
+        engine_tick = act.engine.tick
+
+        def timed_tick():
+            start = time.perf_counter()
+            engine_tick()
+            tick_times.append((time.perf_counter() - start) * 1000)
+
+        act.engine.tick = timed_tick
+        tick_task = asyncio.create_task(act.tick())
+
+        clients = {}
+        serve_tasks = []
+        for entry in self.trace:
+            delay = act.start_time + entry["time"] - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            event = entry["event"]
+            if event == "connect":
+                client = MemoryClient(f"sim-{entry['client']}")
+                clients[entry["client"]] = client
+                serve_tasks.append(asyncio.create_task(act.server.serve_client(client)))
+            elif event == "input":
+                clients[entry["client"]].feed(entry["data"])
+            elif event == "disconnect":
+                clients[entry["client"]].disconnect()
+
+        await asyncio.sleep(self.tail)
+
+        # Wind down
+        for client in clients.values():
+            client.disconnect()
+        await asyncio.gather(*serve_tasks)
+
+        tick_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await tick_task
+        act.engine.close()
+
+        return SimulationResult(
+            transcripts={
+                client_id: client.transcript for client_id, client in clients.items()
+            },
+            tick_times=tick_times,
+            virtual_time=loop.time() - act.start_time,
+            real_time=time.perf_counter() - real_start,
+        )
+
+    @staticmethod
+    def _scratch_db(tmp_dir):
+        """
+        Copies the configured SQLite DB (if there is one) into the given directory
+        :param tmp_dir:
+        :return: URI of the copy
+        """
+        prefix = "sqlite:///"
+        path = os.path.join(tmp_dir, "data.db")
+        if config.db_uri.startswith(prefix):
+            source = config.db_uri[len(prefix) :]
+            if os.path.exists(source):
+                shutil.copyfile(source, path)
+        return f"{prefix}{path}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a client input trace.")
+    parser.add_argument("trace", help="Trace file to replay")
+    parser.add_argument("--db", help="DB URI (defaults to a copy of the configured DB)")
+    parser.add_argument(
+        "--session",
+        type=int,
+        default=-1,
+        help="Index of the recorded session to replay (defaults to the latest)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Profile the replay with cProfile"
+    )
+    args = parser.parse_args()
+    log.configure()
+
+    simulation = Simulation(read_trace(args.trace, args.session), db_uri=args.db)
+    if args.profile:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(simulation.run)
+    else:
+        result = simulation.run()
+
+    ticks = result.tick_times
+    print(f"{len(result.transcripts)} client(s), {len(ticks)} tick(s)")
+    print(
+        f"  Replayed {result.virtual_time:.1f}s of server time "
+        f"in {result.real_time:.3f}s"
+    )
+    if ticks:
+        print(f"  Mean tick:  {sum(ticks) / len(ticks):8.3f}ms")
+        print(f"  Worst tick: {max(ticks):8.3f}ms")
+
+    if args.profile:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
+
+
+if __name__ == "__main__":
+    main()
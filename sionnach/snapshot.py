@@ -0,0 +1,385 @@
+"""
+Binary snapshots of world state, for fast warm starts
+- Captures DB tables into a compact, versioned binary file
+- Loads snapshots back via mmap, without going through the ORM
+- Reloads any table that has changed in the DB since the snapshot was taken
+
+Tables are stored column by column, with each kind of value packed into its own
+contiguous array (all the strings in a column share a single UTF-8 blob), so that
+loading decodes whole columns in bulk rather than one value at a time.
+
+Change detection relies on per-table version counters (see `track_changes`),
+which DB triggers bump on every insert, update or delete.  Each snapshotted table
+records the version it was captured at.
+
+File layout (all integers little-endian):
+    Header:  magic (4s), format version (H), table count (H), created (d)
+    Table:   name (str), version (q), column count (H), column names (str...),
+             row count (I), columns
+    Column:  value tags (B per row), ints (array of q), floats (array of d),
+             strs (text), bytes (blobs)
+    array:   I count + packed values
+    text:    array of q character offsets (one more than the value count),
+             Q length + UTF-8 data
+    blobs:   array of q byte offsets (one more than the value count), Q length +
+             data
+    str:     I length + UTF-8 data
+"""
+import itertools
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+from sqlalchemy import text
+
+from sionnach.db import TableVersion
+from sionnach.exceptions import SnapshotError
+
+MAGIC = b"SNCH"
+VERSION = 3
+
+_HEADER = struct.Struct("<4sHHd")
+_TABLE = struct.Struct("<qH")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+# Value tags
+_NONE, _INT, _FLOAT, _STR, _BYTES = range(5)
+
+Snapshot = namedtuple("Snapshot", ["created", "tables"])
+
+# `version` is the table's change version when it was captured (None if the
+# table's changes aren't tracked)
+SnapshotTable = namedtuple("SnapshotTable", ["columns", "rows", "version"])
+
+
+# --[ Writing ]-----------------------------------------------------------------
+def _pack_str(out, value):
+    data = value.encode()
+    out.append(_U32.pack(len(data)))
+    out.append(data)
+
+
+def _pack_array(out, typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    out.append(_U32.pack(len(packed)))
+    out.append(packed.tobytes())
+
+
+def _pack_chunks(out, chunks, data):
+    """
+    Packs a list of strs or bytes as offsets into their concatenated data
+    :param out:
+    :param chunks:
+    :param data: The encoded, concatenated chunks
+    :return:
+    """
+    _pack_array(out, "q", itertools.accumulate(map(len, chunks), initial=0))
+    out.append(_U64.pack(len(data)))
+    out.append(data)
+
+
+def _pack_column(out, values):
+    tags = bytearray()
+    ints = []
+    floats = []
+    strs = []
+    blobs = []
+    for value in values:
+        if value is None:
+            tags.append(_NONE)
+        elif isinstance(value, int):
+            tags.append(_INT)
+            ints.append(value)
+        elif isinstance(value, float):
+            tags.append(_FLOAT)
+            floats.append(value)
+        elif isinstance(value, str):
+            tags.append(_STR)
+            strs.append(value)
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            tags.append(_BYTES)
+            blobs.append(bytes(value))
+        else:
+            raise SnapshotError(f"Cannot snapshot value of type {type(value).__name__}")
+
+    out.append(bytes(tags))
+    _pack_array(out, "q", ints)
+    _pack_array(out, "d", floats)
+    _pack_chunks(out, strs, "".join(strs).encode())
+    _pack_chunks(out, blobs, b"".join(blobs))
+
+
+def write_snapshot(path, tables):
+    """
+    Atomically writes the given tables to a snapshot file
+    :param path:
+    :param tables: Dict of table name -> SnapshotTable
+    :return:
+    """
+    out = [_HEADER.pack(MAGIC, VERSION, len(tables), time.time())]
+    for name, table in tables.items():
+        _pack_str(out, name)
+        # Untracked tables are always reloaded, so their version is irrelevant
+        out.append(_TABLE.pack(table.version or 0, len(table.columns)))
+        for column in table.columns:
+            _pack_str(out, column)
+        out.append(_U32.pack(len(table.rows)))
+        for index in range(len(table.columns)):
+            _pack_column(out, [row[index] for row in table.rows])
+
+    # Write to a temporary file first, so that a crash never leaves a partial
+    # snapshot behind
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join(out))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# --[ Reading ]-----------------------------------------------------------------
+def _read(buf, offset, size):
+    data = buf[offset : offset + size]
+    if len(data) != size:
+        raise SnapshotError("Snapshot is truncated.")
+    return data, offset + size
+
+
+def _unpack_str(buf, offset):
+    (length,) = _U32.unpack_from(buf, offset)
+    data, offset = _read(buf, offset + _U32.size, length)
+    return str(data, "utf-8"), offset
+
+
+def _unpack_array(buf, offset, typecode):
+    (count,) = _U32.unpack_from(buf, offset)
+    values = array(typecode)
+    data, offset = _read(buf, offset + _U32.size, count * values.itemsize)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, offset
+
+
+def _unpack_chunks(buf, offset):
+    """
+    Unpacks chunks packed by `_pack_chunks`
+    :param buf:
+    :param offset:
+    :return: (Concatenated data, offsets of each chunk within it, new offset)
+    """
+    offsets, offset = _unpack_array(buf, offset, "q")
+    (length,) = _U64.unpack_from(buf, offset)
+    data, offset = _read(buf, offset + _U64.size, length)
+    return data, offsets, offset
+
+
+def _unpack_column(buf, offset, row_count):
+    tags, offset = _read(buf, offset, row_count)
+    ints, offset = _unpack_array(buf, offset, "q")
+    floats, offset = _unpack_array(buf, offset, "d")
+    text_data, text_offsets, offset = _unpack_chunks(buf, offset)
+    blob_data, blob_offsets, offset = _unpack_chunks(buf, offset)
+
+    # Each kind of value is decoded in bulk
+    text = str(text_data, "utf-8")
+    strs = [text[a:b] for a, b in zip(text_offsets, text_offsets[1:])]
+    blobs = [blob_data[a:b] for a, b in zip(blob_offsets, blob_offsets[1:])]
+    values = {
+        _INT: ints.tolist(),
+        _FLOAT: floats.tolist(),
+        _STR: strs,
+        _BYTES: blobs,
+    }
+
+    # Columns holding a single kind of value (the usual case) need no merging
+    for kind in values.values():
+        if len(kind) == row_count:
+            return kind, offset
+
+    sources = {tag: iter(kind) for tag, kind in values.items()}
+    sources[_NONE] = itertools.repeat(None)
+    try:
+        return [next(sources[tag]) for tag in tags], offset
+    except (KeyError, StopIteration):
+        raise SnapshotError("Snapshot column is corrupt.")
+
+
+def read_snapshot(path):
+    """
+    Memory-maps and loads the snapshot at the given path
+    :param path:
+    :return: Snapshot
+    """
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Can't map an empty file
+            raise SnapshotError(f"'{path}' is empty.")
+
+    with buf:
+        try:
+            magic, version, table_count, created = _HEADER.unpack_from(buf, 0)
+        except struct.error:
+            raise SnapshotError(f"'{path}' is not a valid snapshot.")
+        if magic != MAGIC:
+            raise SnapshotError(f"'{path}' is not a valid snapshot.")
+        if version != VERSION:
+            raise SnapshotError(
+                f"'{path}' has snapshot version {version} (expected {VERSION})."
+            )
+
+        try:
+            offset = _HEADER.size
+            tables = {}
+            for _ in range(table_count):
+                name, offset = _unpack_str(buf, offset)
+                version, column_count = _TABLE.unpack_from(buf, offset)
+                offset += _TABLE.size
+
+                columns = []
+                for _ in range(column_count):
+                    column, offset = _unpack_str(buf, offset)
+                    columns.append(column)
+
+                (row_count,) = _U32.unpack_from(buf, offset)
+                offset += _U32.size
+                values = []
+                for _ in range(column_count):
+                    column_values, offset = _unpack_column(buf, offset, row_count)
+                    values.append(column_values)
+                rows = list(zip(*values)) if values else [()] * row_count
+
+                tables[name] = SnapshotTable(tuple(columns), rows, version)
+        except (struct.error, UnicodeDecodeError, SnapshotError):
+            raise SnapshotError(f"'{path}' is truncated or corrupt.")
+
+    return Snapshot(created, tables)
+
+
+# --[ DB interface ]------------------------------------------------------------
+_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS {table}_{event}_version AFTER {event} ON {table}
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+END
+"""
+
+
+def track_changes(db_session, tables):
+    """
+    Installs DB triggers that bump the version of each of the given tables on
+    every insert, update or delete, whichever client makes the change.
+    Currently SQLite only; changes to tables on other DBs aren't tracked, so they
+    are always loaded from the DB directly.
+    Versions start at a random value, so that snapshots taken from a different
+    DB are never mistaken for current ones.
+    :param db_session:
+    :param tables: List of SQLAlchemy Tables
+    :return: Whether changes are being tracked
+    """
+    if db_session.get_bind().dialect.name != "sqlite":
+        return False
+
+    for table in tables:
+        if db_session.query(TableVersion).get(table.name) is None:
+            db_session.add(
+                TableVersion(name=table.name, version=random.getrandbits(62))
+            )
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            db_session.execute(text(_TRIGGER.format(table=table.name, event=event)))
+    db_session.commit()
+    return True
+
+
+def table_versions(db_session, tables):
+    """
+    Returns the current change versions of the given tables
+    :param db_session:
+    :param tables: List of SQLAlchemy Tables
+    :return: Dict of table name -> version (None if the table isn't tracked)
+    """
+    versions = dict(
+        db_session.query(TableVersion.name, TableVersion.version).filter(
+            TableVersion.name.in_([table.name for table in tables])
+        )
+    )
+    return {table.name: versions.get(table.name) for table in tables}
+
+
+def capture_table(db_session, table, version=None):
+    """
+    Reads every row of the given SQLAlchemy table.
+    Uses a plain SELECT rather than the ORM, since we only want the raw values.
+    :param db_session:
+    :param table: SQLAlchemy Table (e.g., `Help.__table__`)
+    :param version: The table's current change version
+    :return: SnapshotTable
+    """
+    columns = tuple(column.name for column in table.columns)
+    query = table.select().order_by(*table.primary_key.columns)
+    rows = [tuple(row) for row in db_session.execute(query)]
+    return SnapshotTable(columns, rows, version)
+
+
+def refresh_tables(db_session, tables, cached, reload_untracked=True):
+    """
+    Reloads each of the given SQLAlchemy tables that has changed in the DB (or
+    whose schema has changed) since its cached copy was captured
+    :param db_session:
+    :param tables: List of SQLAlchemy Tables
+    :param cached: Dict of table name -> SnapshotTable
+    :param reload_untracked: Whether to reload tables whose changes aren't tracked
+        (which can't be told apart from changed ones without reading them in full)
+    :return: (Dict of table name -> SnapshotTable, whether anything changed)
+    """
+    versions = table_versions(db_session, tables)
+
+    loaded = {}
+    changed = False
+    for table in tables:
+        columns = tuple(column.name for column in table.columns)
+        version = versions[table.name]
+        current = cached.get(table.name)
+        if version is None:
+            unchanged = not reload_untracked
+        else:
+            unchanged = current is not None and current.version == version
+        if unchanged and current is not None and current.columns == columns:
+            loaded[table.name] = current
+            continue
+
+        fresh = capture_table(db_session, table, version)
+        # (Untracked tables only count as changed if their contents have)
+        if current is None or version is not None or fresh[:2] != current[:2]:
+            changed = True
+        loaded[table.name] = fresh
+
+    return loaded, changed
+
+
+def load_tables(db_session, tables, path):
+    """
+    Loads the given SQLAlchemy tables from the snapshot at the given path,
+    reloading any that have changed in the DB since the snapshot was taken.
+    Falls back to loading everything from the DB if there is no usable snapshot.
+    :param db_session:
+    :param tables: List of SQLAlchemy Tables
+    :param path:
+    :return: (Dict of table name -> SnapshotTable, whether anything was reloaded)
+    """
+    try:
+        snapshot_tables = read_snapshot(path).tables
+    except (FileNotFoundError, SnapshotError):
+        snapshot_tables = {}
+
+    return refresh_tables(db_session, tables, snapshot_tables)
@@ -0,0 +1,100 @@
+"""
+Client input traces, for replaying real sessions offline (see sionnach.simulation)
+
+Traces are JSON lines files, with one object per event:
+    {"time": <s since recording started>, "client": <id>, "event": <event>,
+     "data": <input line; input events only>}
+where <event> is one of "connect", "input" or "disconnect".
+Each server run appends a new session to the trace file, starting with a
+{"event": "session", "started": <wall clock time>} marker, so that restarting
+never overwrites the trace of the previous run.
+Password input is masked before it is recorded (so simulations skip password
+checks).
+"""
+import asyncio
+import itertools
+import json
+import time
+
+
+class TraceRecorder:
+    def __init__(self, path):
+        # Each server run starts a new session in the trace
+        self._file = open(path, "a")
+        self._file.write(
+            f"{json.dumps({'event': 'session', 'started': time.time()})}\n"
+        )
+        self._file.flush()
+        self._start = None
+
+        # Client -> trace id
+        self._ids = {}
+        self._counter = itertools.count(1)
+
+    def record(self, client, event, data=None, now=None):
+        """
+        Appends an event for the given client to the trace
+        :param client:
+        :param event: "connect", "input" or "disconnect"
+        :param data: Input line (for input events)
+        :param now: Event loop time the event happened at (defaults to the current
+            time)
+        :return:
+        """
+        if now is None:
+            now = asyncio.get_running_loop().time()
+        if self._start is None:
+            self._start = now
+
+        if event == "connect":
+            self._ids[client] = next(self._counter)
+        if client not in self._ids:
+            # Already disconnected
+            return
+        if event == "disconnect":
+            client_id = self._ids.pop(client)
+        else:
+            client_id = self._ids[client]
+
+        entry = {
+            "time": round(now - self._start, 6),
+            "client": client_id,
+            "event": event,
+        }
+        if data is not None:
+            entry["data"] = data
+        self._file.write(f"{json.dumps(entry)}\n")
+
+        # Flushed straight away, so that a crash doesn't lose the end of the trace
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_trace(path, session=-1):
+    """
+    Loads a session from the trace at the given path
+    :param path:
+    :param session: Index of the session to load (by default, the latest one)
+    :return: List of trace events (dicts), in time order
+    """
+    sessions = [[]]
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry["event"] == "session":
+                sessions.append([])
+            else:
+                sessions[-1].append(entry)
+
+    # (Events from before the first marker count as a session of their own)
+    if not sessions[0]:
+        sessions.pop(0)
+    try:
+        trace = sessions[session]
+    except IndexError:
+        raise ValueError(f"'{path}' has {len(sessions)} session(s).")
+    return sorted(trace, key=lambda entry: entry["time"])
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from sionnach import config
+from sionnach.controller import Act
+from sionnach.simulation import MemoryClient
+
+
+def test_failed_warm_up_drops_waiting_clients(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "db_uri", f"sqlite:///{tmp_path}/missing/data.db")
+
+    async def run():
+        act = Act()
+        start = asyncio.create_task(act.start())
+        await asyncio.sleep(0)
+
+        # Connects while the server is still warming up
+        client = MemoryClient("early")
+        serve = asyncio.create_task(act.server.serve_client(client))
+
+        with pytest.raises(Exception):
+            await start
+        await asyncio.wait_for(serve, timeout=5)
+        return client.transcript
+
+    transcript = asyncio.run(run())
+    assert "Starting up, please wait..." in transcript
+    assert "Please try again later." in transcript
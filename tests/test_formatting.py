@@ -0,0 +1,42 @@
+from sionnach import formatting
+
+
+def test_render_wraps_to_width():
+    text = "the quick brown fox jumps over the lazy dog"
+    assert formatting.render(text, 10, False) == (
+        "the quick\r\nbrown fox\r\njumps over\r\nthe lazy\r\ndog\r\n"
+    )
+
+
+def test_render_ignores_markup_when_wrapping():
+    text = "{rred{x {ggreen{x {bblue{x"
+    assert formatting.render(text, 10, False) == "red green\r\nblue\r\n"
+    assert formatting.render(text, 10, True) == (
+        "\x1b[0;31mred\x1b[0m \x1b[0;32mgreen\x1b[0m\r\n"
+        "\x1b[0;34mblue\x1b[0m\x1b[0m\r\n"
+    )
+
+
+def test_render_escaped_brace_and_newline():
+    assert formatting.render("{{r}", 80, True) == "{r}\r\n"
+    assert formatting.render("line\r\n", 80, True) == "line\r\n"
+    assert formatting.render("", 80, True) == "\r\n"
+
+
+def test_render_splits_long_words():
+    assert formatting.render("abcdefghij", 4, False) == "abcd\r\nefgh\r\nij\r\n"
+
+
+def test_paginate():
+    text = "\n".join(str(i) for i in range(7))
+    pages = formatting.paginate(text, 80, 4, False)
+    assert pages == ("0\r\n1\r\n2\r\n", "3\r\n4\r\n5\r\n", "6\r\n")
+
+
+def test_render_is_cached():
+    formatting.render.cache_clear()
+    formatting.render("cached", 80, True)
+    formatting.render("cached", 80, True)
+    formatting.render("cached", 40, True)
+    info = formatting.render.cache_info()
+    assert info.hits == 1 and info.misses == 2
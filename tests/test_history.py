@@ -0,0 +1,71 @@
+from sionnach import config
+from sionnach.character import Character
+from sionnach.history import Aliases, History, expand_speedwalk
+
+
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+def test_history_ring_buffer():
+    history = History(3)
+    for command in ["look", "north", "get all", "say hi"]:
+        history.add(command)
+
+    assert len(history) == 3
+    assert list(history) == ["north", "get all", "say hi"]
+    assert history.last() == "say hi"
+    assert history.last("g") == "get all"
+    assert history.last("look") is None
+
+
+def test_alias_expansion():
+    aliases = Aliases()
+    aliases.set("k", "kill $*")
+    aliases.set("gw", "get all;wear all")
+
+    assert aliases.expand("k orc") == "kill orc"
+    assert aliases.expand("gw") == "get all;wear all"
+    assert aliases.expand("look") == "look"
+
+
+def test_alias_expansion_is_length_capped():
+    aliases = Aliases()
+    aliases.set("x", "$*" * 256)
+
+    args = "a" * (config.max_input_length - 3)
+    assert aliases.expand(f"x {args}") is None
+    assert aliases.expand("x ab") == "ab" * 256
+    assert aliases.expand("x abc") is None
+
+    char = Character(client=FakeClient(), name="test")
+    char.aliases.set("x", "$*" * 256)
+    assert char._expand_input(f"x {args}") == []
+    assert len(char.client.sent) == 1
+
+
+def test_speedwalk():
+    assert expand_speedwalk("3n2e", 10) == ["n", "n", "n", "e", "e"]
+    assert expand_speedwalk("100n", 4) == ["n", "n", "n", "n"]
+    assert expand_speedwalk("north", 10) is None
+
+
+def test_character_expands_input():
+    char = Character(client=FakeClient(), name="test")
+    char.aliases.set("gw", "get all;wear all")
+
+    assert char._expand_input("gw") == ["get all", "wear all"]
+    assert char._expand_input("!") == ["get all", "wear all"]
+    assert char._expand_input("look;.2nu") == ["look", "n", "n", "u"]
+
+
+def test_character_caps_expanded_input():
+    char = Character(client=FakeClient(), name="test")
+
+    commands = char._expand_input(".1000n")
+    assert len(commands) == config.max_expanded_commands
+    assert len(char.client.sent) == 1
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sionnach.db import Alias, Base
+from sionnach.journal import Journal, compact, read_journal, rotated_journals
+
+
+def test_journal_group_commit(tmp_path):
+    path = str(tmp_path / "actions.journal")
+    journal = Journal(path)
+    journal.record("alias_set", user="bob", name="k", expansion="kill $*")
+    journal.record("alias_remove", user="bob", name="k")
+
+    # Nothing hits the disk until the commit
+    assert list(read_journal(path)) == []
+
+    journal.commit()
+    assert list(read_journal(path)) == [
+        ("alias_set", {"user": "bob", "name": "k", "expansion": "kill $*"}),
+        ("alias_remove", {"user": "bob", "name": "k"}),
+    ]
+    journal.close()
+
+
+def test_journal_commits_from_worker_threads(tmp_path):
+    path = str(tmp_path / "actions.journal")
+    journal = Journal(path)
+    with ThreadPoolExecutor() as executor:
+        commits = []
+        for i in range(200):
+            journal.record("alias_remove", user="bob", name=str(i))
+            if i % 10 == 0:
+                commits.append(executor.submit(journal.commit))
+        for commit in commits:
+            commit.result()
+    journal.close()
+
+    # Nothing lost or reordered
+    names = [data["name"] for _, data in read_journal(path)]
+    assert names == [str(i) for i in range(200)]
+
+
+def test_journal_ignores_torn_tail(tmp_path):
+    path = tmp_path / "actions.journal"
+    journal = Journal(str(path))
+    journal.record("alias_remove", user="bob", name="a")
+    journal.record("alias_remove", user="bob", name="b")
+    journal.close()
+
+    path.write_bytes(path.read_bytes()[:-3])
+    assert list(read_journal(str(path))) == [
+        ("alias_remove", {"user": "bob", "name": "a"})
+    ]
+
+
+def test_journal_compaction(tmp_path):
+    db_engine = create_engine("sqlite://")
+    Base.metadata.create_all(db_engine)
+    db_session = sessionmaker(bind=db_engine)()
+
+    path = str(tmp_path / "actions.journal")
+    journal = Journal(path)
+    journal.record("alias_set", user="bob", name="k", expansion="kill")
+    journal.record("alias_set", user="bob", name="gw", expansion="get all")
+    journal.record("alias_set", user="bob", name="k", expansion="kill $*")
+    journal.record("alias_remove", user="bob", name="gw")
+    assert journal.rotate() is not None
+    assert journal.rotate() is None
+
+    paths = rotated_journals(path)
+    assert compact(db_session, paths) == 4
+    assert rotated_journals(path) == []
+
+    aliases = [(a.user, a.name, a.expansion) for a in db_session.query(Alias)]
+    assert aliases == [("bob", "k", "kill $*")]
+    journal.close()
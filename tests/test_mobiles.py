@@ -0,0 +1,58 @@
+import pytest
+
+from sionnach.mobiles import AggroEvent, DeathEvent, MoveEvent, Mobiles
+
+# A single room, with no exits
+ONE_ROOM = [[-1, -1, -1, -1, -1, -1]]
+
+
+def test_mobiles_regenerate_and_die():
+    mobiles = Mobiles(ONE_ROOM, capacity=1)
+    a = mobiles.spawn(room=0, hp=10, regen=3)
+    b = mobiles.spawn(room=0, hp=10)
+
+    mobiles.damage([a, b], [5, 10])
+    assert mobiles.step() == [DeathEvent(b, 0)]
+    assert mobiles.hp[a] == 8
+    assert len(mobiles) == 1
+
+    mobiles.step()
+    assert mobiles.hp[a] == 10
+
+    # Dead slots are reused
+    assert mobiles.spawn(room=0, hp=1) == b
+
+
+def test_mobiles_wander():
+    # Two rooms, joined north/south
+    exits = [[1, -1, -1, -1, -1, -1], [-1, -1, 0, -1, -1, -1]]
+    mobiles = Mobiles(exits, seed=1)
+    mobile = mobiles.spawn(room=0, hp=10, move_interval=2)
+
+    moves = []
+    for _ in range(200):
+        moves.extend(mobiles.step())
+    assert moves
+    assert all(isinstance(event, MoveEvent) for event in moves)
+    assert all(event.source != event.destination for event in moves)
+    assert mobiles.room[mobile] == moves[-1].destination
+
+
+def test_mobiles_aggro_once():
+    mobiles = Mobiles(ONE_ROOM * 4)
+    mobiles.spawn(room=3, hp=10)
+    angry = mobiles.spawn(room=3, hp=10, aggressive=True)
+
+    assert mobiles.step(player_rooms=[3]) == [AggroEvent(angry, 3)]
+    assert mobiles.step(player_rooms=[3]) == []
+    assert mobiles.step(player_rooms=[]) == []
+    assert mobiles.step(player_rooms=[3]) == [AggroEvent(angry, 3)]
+
+
+def test_mobiles_spawn_checks_room():
+    mobiles = Mobiles(ONE_ROOM, seed=0)
+    with pytest.raises(ValueError):
+        mobiles.spawn(room=1, hp=10, move_interval=1)
+    with pytest.raises(ValueError):
+        mobiles.spawn(room=-1, hp=10)
+    assert len(mobiles) == 0
@@ -0,0 +1,90 @@
+import asyncio
+
+from sionnach import config
+from sionnach.reaper import Reaper
+
+
+class FakeClient:
+    def __init__(self, authenticated=False):
+        self.authenticated = authenticated
+        self.kill_switch = asyncio.get_running_loop().create_future()
+        self.closed = asyncio.get_running_loop().create_future()
+        self.keepalives = 0
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+    def send_keepalive(self):
+        self.keepalives += 1
+
+    async def close(self):
+        if not self.kill_switch.done():
+            self.kill_switch.set_result(True)
+
+
+def test_reaper_keepalive_and_timeouts():
+    async def run():
+        reaper = Reaper()
+        guest = FakeClient()
+        player = FakeClient(authenticated=True)
+        reaper.track(guest, 0)
+        reaper.track(player, 0)
+
+        # Quiet clients get keepalives
+        assert reaper.sweep(config.keepalive_interval) == []
+        assert guest.keepalives == player.keepalives == 1
+
+        # Unauthenticated clients expire first
+        assert reaper.sweep(config.login_timeout) == [guest]
+        await asyncio.sleep(0)
+        assert guest.kill_switch.done()
+
+        # Activity pushes the deadline back
+        player.last_active = config.idle_timeout - 1
+        assert reaper.sweep(config.idle_timeout) == []
+        assert reaper.sweep(2 * config.idle_timeout) == [player]
+
+        # Closed clients are no longer tracked
+        await asyncio.sleep(0)
+        reaper.sweep(3 * config.idle_timeout)
+        assert len(reaper) == 0
+
+    asyncio.run(run())
+
+
+def test_reaper_login_deadline_ignores_input():
+    async def run():
+        reaper = Reaper()
+        guest = FakeClient()
+        reaper.track(guest, 0)
+
+        # Blank lines at the login prompt don't buy more time to log in
+        now = 0
+        while now < config.login_timeout:
+            guest.last_active = now
+            assert reaper.sweep(now) == []
+            now += config.login_timeout / 4
+        assert reaper.sweep(now) == [guest]
+
+    asyncio.run(run())
+
+
+def test_reaper_forgets_disconnected_clients():
+    async def run():
+        reaper = Reaper()
+        gone = FakeClient()
+        left = FakeClient(authenticated=True)
+        reaper.track(gone, 0)
+        reaper.track(left, 0)
+
+        # Dropped from the client's end
+        gone.closed.set_result(True)
+        reaper.untrack(left)
+        assert len(reaper) == 1
+
+        assert reaper.sweep(config.idle_timeout) == []
+        assert gone.keepalives == left.keepalives == 0
+        assert len(reaper) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,80 @@
+import asyncio
+import gc
+
+from sionnach.character import Character
+from sionnach.server import Client, DO, IAC, NAWS, SB, SE, WILL
+
+
+def test_telnet_commands_split_across_lines_and_chunks():
+    async def run():
+        client = Client(reader=None, writer=None)
+
+        # A NAWS height of 10 contains a newline byte, which must not end the line
+        naws = bytes([IAC, WILL, NAWS, IAC, SB, NAWS, 0, 10, 0, 24, IAC, SE])
+        assert client._feed(naws[:8]) == []
+        assert client._feed(naws[8:] + b"bob\r\n") == [b"bob\r"]
+        assert (client.width, client.height) == (10, 24)
+
+        # Resizes apply straight away, even partway through a line
+        assert client._feed(b"sa") == []
+        assert client._feed(bytes([IAC, SB, NAWS, 0, 100, 0])) == []
+        assert client._feed(bytes([50, IAC, SE]) + b"y ") == []
+        assert (client.width, client.height) == (100, 50)
+
+        # Escaped literal 255, and other commands dropped
+        assert client._feed(bytes([IAC, DO, 1, IAC, IAC]) + b"!\n") == [b"say \xff!"]
+
+    asyncio.run(run())
+
+
+def test_paging_and_colour_toggle():
+    async def run():
+        client = Client(reader=None, writer=None)
+        client.height = 3
+        char = Character(client=client, name="test")
+
+        char.send_paged("\n".join(f"line {i}" for i in range(10)))
+        assert client.pending_pages
+
+        # Enter continues; any other input abandons the rest of the output
+        await client._queue_line(b"")
+        assert char.get_input() is None
+        pages_left = len(client.pending_pages)
+        await client._queue_line(b"look")
+        assert char.get_input() == "look"
+        assert pages_left and not client.pending_pages
+
+        await client._queue_line(b"colour off")
+        assert char.get_input() is None
+        assert client.colour is False
+
+    asyncio.run(run())
+
+
+def test_failed_write_closes_client():
+    class DeadClient(Client):
+        async def _read(self):
+            return await asyncio.Event().wait()
+
+        async def _write(self, data):
+            raise ConnectionResetError
+
+        async def _close_socket(self):
+            pass
+
+    async def run():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: errors.append(context)
+        )
+
+        client = DeadClient(reader=None, writer=None)
+        client.send_keepalive()
+        await asyncio.wait_for(client.communicate_until_closed(), timeout=5)
+        assert client.closed.done()
+
+        # No task is left with an unretrieved exception
+        gc.collect()
+        assert errors == []
+
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+import asyncio
+
+from sionnach import config
+from sionnach.controller import Act
+from sionnach.simulation import MemoryClient, Simulation
+from sionnach.trace import read_trace
+
+TRACE = [
+    {"time": 0.0, "client": 1, "event": "connect"},
+    {"time": 1.0, "client": 1, "event": "input", "data": "tester"},
+    {"time": 2.0, "client": 1, "event": "input", "data": "y"},
+    {"time": 3.0, "client": 1, "event": "input", "data": "secret"},
+    {"time": 3.5, "client": 1, "event": "input", "data": "secret"},
+    {"time": 30.0, "client": 1, "event": "disconnect"},
+]
+
+
+def test_simulation_replays_trace_in_virtual_time():
+    result = Simulation(TRACE, db_uri="sqlite://").run()
+
+    transcript = result.transcripts[1]
+    assert "Create a new user named 'tester'?" in transcript
+    assert "<TICK> 1 active connection(s)." in transcript
+
+    # 30s of trace plus the tail, without waiting in real time
+    assert result.virtual_time >= 30
+    assert result.real_time < 30
+    assert len(result.tick_times) >= 6
+
+
+def test_simulation_is_deterministic():
+    first = Simulation(TRACE, db_uri="sqlite://").run()
+    second = Simulation(TRACE, db_uri="sqlite://").run()
+    assert first.transcripts == second.transcripts
+    assert len(first.tick_times) == len(second.tick_times)
+
+
+def test_simulation_accepts_masked_passwords():
+    trace = TRACE[:-1] + [
+        {"time": 10.0, "client": 1, "event": "disconnect"},
+        {"time": 11.0, "client": 2, "event": "connect"},
+        {"time": 12.0, "client": 2, "event": "input", "data": "tester"},
+        {"time": 13.0, "client": 2, "event": "input", "data": "********"},
+    ]
+    result = Simulation(trace, db_uri="sqlite://").run()
+
+    transcript = result.transcripts[2]
+    assert "Password:" in transcript
+    assert "Invalid password." not in transcript
+    assert "<TICK>" in transcript
+
+
+async def _authenticated(client):
+    while not client.authenticated:
+        await asyncio.sleep(0.01)
+
+
+def test_trace_masks_typed_ahead_passwords(monkeypatch, tmp_path):
+    trace_path = tmp_path / "input.trace"
+    monkeypatch.setattr(config, "db_uri", f"sqlite:///{tmp_path / 'data.db'}")
+    monkeypatch.setattr(config, "snapshot_path", str(tmp_path / "world.snapshot"))
+    monkeypatch.setattr(config, "journal_path", str(tmp_path / "actions.journal"))
+    monkeypatch.setattr(config, "trace_path", str(trace_path))
+
+    async def session(lines):
+        act = Act()
+        await act.start()
+        client = MemoryClient("typist")
+        serve = asyncio.create_task(act.server.serve_client(client))
+
+        # Everything arrives in one chunk, before the name has been handled
+        client._lines.put_nowait(b"".join(f"{line}\r\n".encode() for line in lines))
+        await asyncio.wait_for(_authenticated(client), timeout=5)
+
+        client.disconnect()
+        await serve
+        act.engine.close()
+        act.server.recorder.close()
+
+    # Restarting adds a session rather than overwriting the last one
+    asyncio.run(session(["tester", "y", "hunter2", "hunter2"]))
+    asyncio.run(session(["tester", "hunter2"]))
+
+    assert "hunter2" not in trace_path.read_text()
+    first, second = (
+        [entry.get("data") for entry in read_trace(str(trace_path), session)]
+        for session in (0, 1)
+    )
+    assert first == [None, "tester", "y", "********", "********", None]
+    assert second == [None, "tester", "********", None]
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sionnach.db import Base, Help
+from sionnach.exceptions import SnapshotError
+from sionnach.snapshot import (
+    SnapshotTable,
+    load_tables,
+    read_snapshot,
+    refresh_tables,
+    track_changes,
+    write_snapshot,
+)
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "world.snapshot")
+    tables = {
+        "help": SnapshotTable(
+            ("id", "name", "text"), [(1, "MOTD", "Hello!"), (2, "LOGIN", None)], 2
+        ),
+        "users": SnapshotTable(("id", "password", "score"), [(5, b"\x00hash", 1.5)], 5),
+    }
+    write_snapshot(path, tables)
+
+    snapshot = read_snapshot(path)
+    assert snapshot.tables == tables
+
+
+def test_snapshot_rejects_bad_files(tmp_path):
+    path = tmp_path / "world.snapshot"
+
+    path.write_bytes(b"")
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))
+
+    path.write_bytes(b"not a snapshot at all")
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))
+
+    write_snapshot(str(path), {"help": SnapshotTable(("id",), [(1,), (2,)], 2)})
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(path))
+
+
+def test_snapshot_reloads_changed_tables(tmp_path):
+    path = str(tmp_path / "world.snapshot")
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'data.db'}")
+    Base.metadata.create_all(db_engine)
+    db_session = sessionmaker(bind=db_engine)()
+    db_session.add(Help(name="MOTD", text="old motd"))
+    db_session.commit()
+
+    def load():
+        tables, changed = load_tables(db_session, [Help.__table__], path)
+        if changed:
+            write_snapshot(path, tables)
+        return [row[-1] for row in tables["help"].rows], changed
+
+    assert track_changes(db_session, [Help.__table__])
+    assert load() == (["old motd"], True)
+    assert load() == (["old motd"], False)
+
+    # Changes made outside the ORM are picked up too
+    db_session.execute("UPDATE help SET text = 'new motd'")
+    db_session.commit()
+    assert load() == (["new motd"], True)
+
+    db_session.execute("DELETE FROM help")
+    db_session.commit()
+    assert load() == ([], True)
+    assert load() == ([], False)
+
+
+def test_refresh_can_skip_untracked_tables(tmp_path):
+    db_engine = create_engine("sqlite://")
+    Base.metadata.create_all(db_engine)
+    db_session = sessionmaker(bind=db_engine)()
+    db_session.add(Help(name="MOTD", text="old motd"))
+    db_session.commit()
+
+    # Without change tracking, every refresh would mean reading the whole table
+    tables, _ = load_tables(db_session, [Help.__table__], str(tmp_path / "none"))
+    db_session.execute("UPDATE help SET text = 'new motd'")
+    assert refresh_tables(
+        db_session, [Help.__table__], tables, reload_untracked=False
+    ) == (tables, False)
+    assert refresh_tables(db_session, [Help.__table__], tables)[1]